@@ -1,99 +1,106 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import warnings
+import market_data
+from ohlcv import OHLCV
+import screens
+import indicators
 warnings.filterwarnings('ignore')
 
+# Interval -> lookback this analyzer needs
+DATA_REQUIREMENTS = {'1h': '2mo'}
+market_data.register(DATA_REQUIREMENTS)
+
+# Fewest hourly bars worth analyzing
+MIN_BARS = 100
+
+# Gate: close this far below the 2-month high, at or below the lows of the last SWING_WINDOW bars
+DISCOUNT_THRESHOLD = 0.15
+SWING_WINDOW = 10
+
 def get_hourly_data(symbol, period="2mo", interval="1h"):
     """Get hourly stock data"""
     try:
-        hourly_data = yf.download(symbol, period=period, interval=interval, progress=False)
-        if hourly_data.empty or len(hourly_data) < 100:
+        hourly_data = market_data.get_frame(symbol, interval, period)
+        if hourly_data.empty or len(hourly_data) < MIN_BARS:
             return None
 
-        data = {
-            'open': [float(x) for x in hourly_data['Open'].values],
-            'high': [float(x) for x in hourly_data['High'].values],
-            'low': [float(x) for x in hourly_data['Low'].values],
-            'close': [float(x) for x in hourly_data['Close'].values]
-        }
-        return data
+        return OHLCV.from_frame(hourly_data)
     except:
         return None
 
-def calculate_discount_hourly(data):
+def calculate_discount_hourly(data, threshold=DISCOUNT_THRESHOLD, graph=None):
     """Check if stock is 15% below 2-month high"""
-    try:
-        all_highs = data['high']
-        current_price = data['close'][-1]
-        period_high = max(all_highs)
-        discount_from_high = (period_high - current_price) / period_high
-        return discount_from_high > 0.15
-    except:
+    if not len(data['close']):
         return False
 
-def is_swing_low_hourly(data):
+    graph = graph or indicators.IndicatorGraph(data)
+    current_price = data['close'][-1]
+    period_high = graph.highest('high')
+    discount_from_high = (period_high - current_price) / period_high
+    return discount_from_high > threshold
+
+def is_swing_low_hourly(data, window=SWING_WINDOW, graph=None):
     """Check if price is at swing low - hourly"""
-    try:
-        current_low = data['low'][-1]
-        lookback = data['low'][-11:-1]
-        if len(lookback) > 0 and current_low <= min(lookback):
-            return True
-        return False
-    except:
+    if len(data['low']) < 2:
         return False
 
-def detect_order_block_hourly(data):
-    """Detect Order Blocks - hourly"""
-    try:
-        for i in range(len(data['close'])-10, max(len(data['close'])-100, 0), -1):
-            if data['close'][i] < data['open'][i]:
-                bullish_count = 0
-                for j in range(i+1, min(i+15, len(data['close']))):
-                    if data['close'][j] > data['open'][j]:
-                        bullish_count += 1
-                    else:
-                        break
-
-                if 2 <= bullish_count <= 12:
-                    first_bullish_close = data['close'][i+1]
-                    last_bullish_close = data['close'][i+bullish_count]
-                    rally_pct = (last_bullish_close - first_bullish_close) / first_bullish_close
-                    return rally_pct > 0.003
-        return False
-    except:
+    graph = graph or indicators.IndicatorGraph(data)
+    current_low = data['low'][-1]
+    return bool(current_low <= graph.lowest('low', window, skip=1))
+
+def screen_bajaj_hourly(datas, threshold=DISCOUNT_THRESHOLD, window=SWING_WINDOW):
+    """evaluate_bajaj_hourly's discount-zone and swing-low gate for many symbols at once (boolean mask)"""
+    m, lengths = screens.stack_ohlc(datas, fields=('high', 'low', 'close'))
+    return (screens.discount_mask(m['high'], m['low'], m['close'], threshold, inclusive=False, require_range=False) &
+            screens.swing_low_mask(m['low'], lengths, window, full_window=False))
+
+def detect_order_block_hourly(data, graph=None):
+    """Detect Order Blocks - hourly: most recent bearish candle 10-99 bars
+    back followed by 2-12 bullish candles that rallied more than 0.3%"""
+    if not len(data['close']):
         return False
 
+    graph = graph or indicators.IndicatorGraph(data)
+    series = screens.order_block_series(data['open'], data['close'], newest=10, oldest=100,
+                                        max_run=14, run_bounds=(2, 12), rally_threshold=0.003,
+                                        run=graph.run_lengths(), bearish=graph.bearish())
+    return bool(series[-1])
+
+def evaluate_bajaj_hourly(symbol, data):
+    """Bajaj-style checks on already-fetched hourly data (raises on bad input)"""
+    graph = indicators.graph(symbol, '1h', data)
+    discount_zone = calculate_discount_hourly(data, graph=graph)
+    swing_low = is_swing_low_hourly(data, graph=graph)
+
+    if not (discount_zone and swing_low):
+        return None
+
+    ob = detect_order_block_hourly(data, graph)
+    
+    # Calculate confluence score
+    confluence_factors = [ob]
+    score = sum([1 for factor in confluence_factors if factor])
+    
+    # Priority score
+    priority_score = 0
+    if ob: priority_score += 2
+
+    return {
+        'symbol': symbol.replace('.NS', ''),
+        'discount_zone': 'Y',
+        'swing_low': 'Y',
+        'ob': 'Y' if ob else 'N',
+        'confluence_score': f'{score}/1',
+        'priority_score': priority_score
+    }
+
 def analyze_bajaj_hourly(symbol):
     """Analyze stock for Bajaj-style setup - HOURLY"""
     try:
         data = get_hourly_data(symbol)
         if data is None:
             return None
-
-        discount_zone = calculate_discount_hourly(data)
-        swing_low = is_swing_low_hourly(data)
-
-        if not (discount_zone and swing_low):
-            return None
-
-        ob = detect_order_block_hourly(data)
-        
-        # Calculate confluence score
-        confluence_factors = [ob]
-        score = sum([1 for factor in confluence_factors if factor])
-        
-        # Priority score
-        priority_score = 0
-        if ob: priority_score += 2
-
-        return {
-            'symbol': symbol.replace('.NS', ''),
-            'discount_zone': 'Y',
-            'swing_low': 'Y',
-            'ob': 'Y' if ob else 'N',
-            'confluence_score': f'{score}/1',
-            'priority_score': priority_score
-        }
+        return evaluate_bajaj_hourly(symbol, data)
     except:
         return None
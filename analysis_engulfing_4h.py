@@ -1,90 +1,115 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import warnings
+import market_data
+from ohlcv import OHLCV
+import screens
+import indicators
 warnings.filterwarnings('ignore')
 
+# Interval -> lookback this analyzer needs
+DATA_REQUIREMENTS = {'4h': '2mo'}
+market_data.register(DATA_REQUIREMENTS)
+
+# Fewest 4H bars worth analyzing
+MIN_BARS = 20
+
 def get_4h_data(symbol, period="2mo"):
     """Get 4-hour stock data"""
     try:
-        stock = yf.download(symbol, period=period, interval="4h", progress=False)
-        if stock.empty or len(stock) < 20:
+        stock = market_data.get_frame(symbol, "4h", period)
+        if stock.empty or len(stock) < MIN_BARS:
             return None
 
-        data = {
-            'open': [float(x) for x in stock['Open'].values],
-            'high': [float(x) for x in stock['High'].values],
-            'low': [float(x) for x in stock['Low'].values],
-            'close': [float(x) for x in stock['Close'].values]
-        }
-        return data
+        return OHLCV.from_frame(stock)
     except:
         return None
 
-def is_engulfing_candle_4h(data):
+def is_engulfing_candle_4h(data, graph=None):
     """Check for engulfing candle pattern in 4H"""
-    try:
-        if len(data['close']) < 3:
-            return False, None
+    if len(data['close']) < 3:
+        return False, None
 
-        prev_open = data['open'][-2]
-        prev_high = data['high'][-2]
-        prev_low = data['low'][-2]
-        prev_close = data['close'][-2]
+    graph = graph or indicators.IndicatorGraph(data)
+    bullish, bearish = graph.bullish(), graph.bearish()
 
-        before_prev_open = data['open'][-3]
-        before_prev_high = data['high'][-3]
-        before_prev_low = data['low'][-3]
-        before_prev_close = data['close'][-3]
-
-        engulfing_body_low = min(prev_open, prev_close)
-        engulfing_body_high = max(prev_open, prev_close)
-        engulfed_body_low = min(before_prev_open, before_prev_close)
-        engulfed_body_high = max(before_prev_open, before_prev_close)
-
-        # Bullish engulfing
-        if (prev_close > prev_open and
-            before_prev_close < before_prev_open and
-            engulfing_body_low <= engulfed_body_low and
-            engulfing_body_high >= engulfed_body_high and
-            prev_low <= before_prev_low and
-            prev_high >= before_prev_high):
-            return True, 'BULLISH'
-
-        # Bearish engulfing
-        if (prev_close < prev_open and
-            before_prev_close > before_prev_open and
-            engulfing_body_low <= engulfed_body_low and
-            engulfing_body_high >= engulfed_body_high and
-            prev_low <= before_prev_low and
-            prev_high >= before_prev_high):
-            return True, 'BEARISH'
+    prev_open = data['open'][-2]
+    prev_high = data['high'][-2]
+    prev_low = data['low'][-2]
+    prev_close = data['close'][-2]
 
-        return False, None
-    except:
-        return False, None
+    before_prev_open = data['open'][-3]
+    before_prev_high = data['high'][-3]
+    before_prev_low = data['low'][-3]
+    before_prev_close = data['close'][-3]
 
-def analyze_engulfing_4h(symbol):
-    """Analyze stock for 4H engulfing patterns"""
-    try:
-        data = get_4h_data(symbol)
-        if data is None:
-            return None
+    engulfing_body_low = min(prev_open, prev_close)
+    engulfing_body_high = max(prev_open, prev_close)
+    engulfed_body_low = min(before_prev_open, before_prev_close)
+    engulfed_body_high = max(before_prev_open, before_prev_close)
 
-        has_engulfing, pattern_type = is_engulfing_candle_4h(data)
+    # Bullish engulfing
+    if (bullish[-2] and
+        bearish[-3] and
+        engulfing_body_low <= engulfed_body_low and
+        engulfing_body_high >= engulfed_body_high and
+        prev_low <= before_prev_low and
+        prev_high >= before_prev_high):
+        return True, 'BULLISH'
 
-        if not has_engulfing:
-            return None
+    # Bearish engulfing
+    if (bearish[-2] and
+        bullish[-3] and
+        engulfing_body_low <= engulfed_body_low and
+        engulfing_body_high >= engulfed_body_high and
+        prev_low <= before_prev_low and
+        prev_high >= before_prev_high):
+        return True, 'BEARISH'
+
+    return False, None
+
+def evaluate_engulfing_4h(symbol, data):
+    """Engulfing check on already-fetched 4H data (raises on bad input)"""
+    has_engulfing, pattern_type = is_engulfing_candle_4h(data, indicators.graph(symbol, '4h', data))
+
+    if not has_engulfing:
+        return None
+
+    current_price = data['close'][-1]
+    prev_close = data['close'][-2]
+    price_change = ((current_price - prev_close) / prev_close) * 100
 
+    return {
+        'symbol': symbol.replace('.NS', ''),
+        'pattern': pattern_type,
+        'price': round(float(current_price), 2),
+        'change_pct': round(float(price_change), 2)
+    }
+
+def scan_engulfing_4h(symbols, datas):
+    """4H engulfing screen for a whole universe at once; same output as evaluate_engulfing_4h"""
+    results = [None] * len(symbols)
+    m, _ = screens.stack_ohlc(datas, length=3)
+    bullish, bearish = screens.engulfing_masks(m['open'], m['high'], m['low'], m['close'])
+    for row in np.nonzero(bullish | bearish)[0]:
+        data = datas[row]
         current_price = data['close'][-1]
         prev_close = data['close'][-2]
         price_change = ((current_price - prev_close) / prev_close) * 100
-
-        return {
-            'symbol': symbol.replace('.NS', ''),
-            'pattern': pattern_type,
-            'price': round(current_price, 2),
-            'change_pct': round(price_change, 2)
+        results[row] = {
+            'symbol': symbols[row].replace('.NS', ''),
+            'pattern': 'BULLISH' if bullish[row] else 'BEARISH',
+            'price': round(float(current_price), 2),
+            'change_pct': round(float(price_change), 2)
         }
+    return results
+
+def analyze_engulfing_4h(symbol):
+    """Analyze stock for 4H engulfing patterns"""
+    try:
+        data = get_4h_data(symbol)
+        if data is None:
+            return None
+        return evaluate_engulfing_4h(symbol, data)
     except:
         return None
@@ -1,130 +1,160 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import warnings
+import market_data
+from ohlcv import OHLCV
+import rsi_engine
+import indicators
 warnings.filterwarnings('ignore')
 
-def get_multi_timeframe_data(symbol):
-    """Get data for 1D, 4H, and 1H timeframes"""
+# Interval -> lookback this analyzer needs
+DATA_REQUIREMENTS = {'1d': '60d', '4h': '30d', '1h': '10d'}
+market_data.register(DATA_REQUIREMENTS)
+
+TIMEFRAMES = ['1D', '4H', '1H']
+TIMEFRAME_INTERVALS = {'1D': '1d', '4H': '4h', '1H': '1h'}
+
+# Fewest bars per timeframe worth analyzing
+MIN_BARS = 21
+
+def get_timeframe_data(symbol, timeframe):
+    """Get data for one of the 1D, 4H and 1H timeframes"""
+    interval = TIMEFRAME_INTERVALS[timeframe]
+    frame = market_data.get_frame(symbol, interval, DATA_REQUIREMENTS[interval])
+    if not frame.empty and len(frame) >= MIN_BARS:
+        return OHLCV.from_frame(frame)
+    return None
+
+def get_multi_timeframe_data(symbol, lazy=False, state=None):
+    """Get data for 1D, 4H, and 1H timeframes.
+
+    lazy=True loads the most selective timeframe (1D) first and stops as
+    soon as a triple alignment is impossible: missing data, a neutral RSI,
+    or a timeframe disagreeing with the ones before it. Pass the
+    RSIStateStore scan_rsi_mtf reports from, so both read the same RSI.
+    """
     data_dict = {}
+    status = None
     
-    try:
-        # 1D data (60 days)
-        daily_data = yf.download(symbol, period="60d", interval="1d", progress=False)
-        if not daily_data.empty and len(daily_data) > 20:
-            data_dict['1D'] = {
-                'open': [float(x) for x in daily_data['Open'].values],
-                'high': [float(x) for x in daily_data['High'].values],
-                'low': [float(x) for x in daily_data['Low'].values],
-                'close': [float(x) for x in daily_data['Close'].values]
-            }
-        
-        # 4H data (30 days)
-        four_hour_data = yf.download(symbol, period="30d", interval="4h", progress=False)
-        if not four_hour_data.empty and len(four_hour_data) > 20:
-            data_dict['4H'] = {
-                'open': [float(x) for x in four_hour_data['Open'].values],
-                'high': [float(x) for x in four_hour_data['High'].values],
-                'low': [float(x) for x in four_hour_data['Low'].values],
-                'close': [float(x) for x in four_hour_data['Close'].values]
-            }
-        
-        # 1H data (10 days)
-        hourly_data = yf.download(symbol, period="10d", interval="1h", progress=False)
-        if not hourly_data.empty and len(hourly_data) > 20:
-            data_dict['1H'] = {
-                'open': [float(x) for x in hourly_data['Open'].values],
-                'high': [float(x) for x in hourly_data['High'].values],
-                'low': [float(x) for x in hourly_data['Low'].values],
-                'close': [float(x) for x in hourly_data['Close'].values]
-            }
-        
-        return data_dict if data_dict else None
-    except:
+    for k, timeframe in enumerate(TIMEFRAMES):
+        data = get_timeframe_data(symbol, timeframe)
+        if data is not None:
+            data_dict[timeframe] = data
+        
+        if lazy:
+            graph = indicators.graph(symbol, TIMEFRAME_INTERVALS[timeframe], data) if data is not None else None
+            rsi_value = calculate_rsi(data, state=state, key=(symbol, timeframe), graph=graph) if graph is not None else None
+            timeframe_status = rsi_status(rsi_value)[0] if rsi_value is not None else None
+            if timeframe_status in (None, "NEUTRAL") or status not in (None, timeframe_status):
+                market_data.record_avoided(symbol, [TIMEFRAME_INTERVALS[tf] for tf in TIMEFRAMES[k + 1:]])
+                return None
+            status = timeframe_status
+    
+    return data_dict if data_dict else None
+
+def passes_daily_gate(symbol, state=None):
+    """Cheapest, most selective check: is the 1D RSI already overbought or oversold?"""
+    data = get_timeframe_data(symbol, '1D')
+    if data is None:
+        return False
+    rsi_value = calculate_rsi(data, state=state, key=(symbol, '1D'), graph=indicators.graph(symbol, '1d', data))
+    return rsi_value is not None and rsi_status(rsi_value)[0] != "NEUTRAL"
+
+def calculate_rsi(data, period=14, state=None, key=None, graph=None):
+    """Calculate RSI for given data.
+
+    With an rsi_state.RSIStateStore and a key such as (symbol, timeframe),
+    the persisted Wilder averages are advanced by the new bars only.
+    Otherwise the RSI is a node of `graph` (the bars' IndicatorGraph), so
+    the daily gate, the lazy loader and the evaluator compute it once.
+    """
+    if state is not None and key is not None:
+        return state.rsi('|'.join(map(str, key)), data, period)
+
+    return (graph or indicators.IndicatorGraph(data)).rsi(period)
+
+def rsi_status(rsi_value):
+    """(status, signal) for a single RSI reading"""
+    if rsi_value >= 70:
+        return "OVERBOUGHT", "🔴"
+    if rsi_value <= 30:
+        return "OVERSOLD", "🟢"
+    return "NEUTRAL", "⚪"
+
+def build_rsi_result(symbol, rsi_by_timeframe):
+    """Result row for a triple alignment, or None when the timeframes disagree"""
+    results = {'symbol': symbol.replace('.NS', '')}
+    statuses = []
+    
+    for timeframe in TIMEFRAMES:
+        rsi_value = float(rsi_by_timeframe[timeframe])
+        status, signal = rsi_status(rsi_value)
+        results[f'{timeframe}_RSI'] = round(rsi_value, 2)
+        results[f'{timeframe}_SIGNAL'] = signal
+        statuses.append(status)
+    
+    if all(status == "OVERBOUGHT" for status in statuses):
+        results['confluence'] = "TRIPLE_OVERBOUGHT"
+        results['signal'] = "🔴🔴🔴"
+    elif all(status == "OVERSOLD" for status in statuses):
+        results['confluence'] = "TRIPLE_OVERSOLD"
+        results['signal'] = "🟢🟢🟢"
+    else:
         return None
+    
+    return results
 
-def calculate_rsi(data, period=14):
-    """Calculate RSI for given data"""
-    try:
-        close_prices = data['close']
-        if len(close_prices) < period + 1:
-            return None
-        
-        deltas = [close_prices[i] - close_prices[i-1] for i in range(1, len(close_prices))]
-        
-        gains = [delta if delta > 0 else 0 for delta in deltas]
-        losses = [-delta if delta < 0 else 0 for delta in deltas]
-        
-        avg_gain = sum(gains[:period]) / period
-        avg_loss = sum(losses[:period]) / period
-        
-        rsi_values = []
-        
-        for i in range(period, len(deltas)):
-            if avg_loss == 0:
-                rsi = 100
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-            
-            rsi_values.append(rsi)
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-        
-        return rsi_values[-1] if rsi_values else None
-    except:
+def evaluate_rsi_mtf(symbol, data_dict, state=None):
+    """RSI confluence on already-fetched 1D/4H/1H data (raises on bad input)"""
+    if not all(tf in data_dict for tf in TIMEFRAMES):
         return None
+    
+    rsi_values = {}
+    for timeframe in TIMEFRAMES:
+        data = data_dict[timeframe]
+        graph = indicators.graph(symbol, TIMEFRAME_INTERVALS[timeframe], data)
+        rsi_value = calculate_rsi(data, state=state, key=(symbol, timeframe), graph=graph)
+        if rsi_value is None:
+            return None
+        rsi_values[timeframe] = rsi_value
+    
+    return build_rsi_result(symbol, rsi_values)
+
+def scan_rsi_mtf(symbols, data_dicts, period=14, state=None):
+    """Triple-RSI screen for a whole universe at once.
+
+    Stacks each timeframe's closes into one matrix and runs the vectorized
+    Wilder RSI over it; returns one entry per symbol, identical to
+    evaluate_rsi_mtf's output. With a persisted RSIStateStore each
+    (symbol, timeframe) is instead advanced by its new bars only.
+    """
+    results = [None] * len(symbols)
+    rows = [i for i, d in enumerate(data_dicts)
+            if d is not None and all(tf in d for tf in TIMEFRAMES)]
+    if not rows:
+        return results
+
+    last = {}
+    for timeframe in TIMEFRAMES:
+        if state is not None:
+            values = [calculate_rsi(data_dicts[i][timeframe], period, state, (symbols[i], timeframe)) for i in rows]
+            last[timeframe] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            continue
+        closes = rsi_engine.stack_closes([data_dicts[i][timeframe]['close'] for i in rows])
+        last[timeframe] = rsi_engine.last_rsi(closes, period)
+
+    overbought, oversold = rsi_engine.triple_screen([last[tf] for tf in TIMEFRAMES])
+    for k in np.nonzero(overbought | oversold)[0]:
+        i = rows[k]
+        results[i] = build_rsi_result(symbols[i], {tf: last[tf][k] for tf in TIMEFRAMES})
+    return results
 
 def analyze_rsi_mtf(symbol):
     """Analyze RSI in multiple timeframes"""
     try:
-        data_dict = get_multi_timeframe_data(symbol)
+        data_dict = get_multi_timeframe_data(symbol, lazy=True)
         if data_dict is None:
             return None
-        
-        if not all(tf in data_dict for tf in ['1D', '4H', '1H']):
-            return None
-        
-        results = {'symbol': symbol.replace('.NS', '')}
-        
-        rsi_values = {}
-        rsi_status = {}
-        rsi_signals = {}
-        
-        for timeframe in ['1D', '4H', '1H']:
-            rsi_value = calculate_rsi(data_dict[timeframe])
-            if rsi_value is None:
-                return None
-            
-            if rsi_value >= 70:
-                status = "OVERBOUGHT"
-                signal = "🔴"
-            elif rsi_value <= 30:
-                status = "OVERSOLD"
-                signal = "🟢"
-            else:
-                status = "NEUTRAL"
-                signal = "⚪"
-            
-            rsi_values[timeframe] = round(rsi_value, 2)
-            rsi_status[timeframe] = status
-            rsi_signals[timeframe] = signal
-        
-        for timeframe in ['1D', '4H', '1H']:
-            results[f'{timeframe}_RSI'] = rsi_values[timeframe]
-            results[f'{timeframe}_SIGNAL'] = rsi_signals[timeframe]
-        
-        statuses = [rsi_status[timeframe] for timeframe in ['1D', '4H', '1H']]
-        
-        if all(status == "OVERBOUGHT" for status in statuses):
-            results['confluence'] = "TRIPLE_OVERBOUGHT"
-            results['signal'] = "🔴🔴🔴"
-        elif all(status == "OVERSOLD" for status in statuses):
-            results['confluence'] = "TRIPLE_OVERSOLD"
-            results['signal'] = "🟢🟢🟢"
-        else:
-            return None
-        
-        return results
+        return evaluate_rsi_mtf(symbol, data_dict)
     except:
         return None
@@ -1,116 +1,123 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import warnings
+import market_data
+from ohlcv import OHLCV
+import screens
+import indicators
 warnings.filterwarnings('ignore')
 
+# Interval -> lookback this analyzer needs
+DATA_REQUIREMENTS = {'1d': '1y'}
+market_data.register(DATA_REQUIREMENTS)
+
+# Fewest daily bars worth analyzing
+MIN_BARS = 100
+
+# Gate: close this far below the 52-week high, at the lowest low of the last SWING_WINDOW bars
+DISCOUNT_THRESHOLD = 0.35
+SWING_WINDOW = 5
+
 def get_stock_data(symbol, period="1y", interval="1d"):
     """Get stock data from Yahoo Finance"""
     try:
-        stock = yf.download(symbol, period=period, interval=interval, progress=False)
-        if stock.empty or len(stock) < 100:
+        stock = market_data.get_frame(symbol, interval, period)
+        if stock.empty or len(stock) < MIN_BARS:
             return None
 
-        data = {
-            'open': [float(x) for x in stock['Open'].values],
-            'high': [float(x) for x in stock['High'].values],
-            'low': [float(x) for x in stock['Low'].values],
-            'close': [float(x) for x in stock['Close'].values],
-            'volume': [float(x) for x in stock['Volume'].values]
-        }
-        return data
+        return OHLCV.from_frame(stock)
     except:
         return None
 
-def calculate_discount_zone(data):
+def calculate_discount_zone(data, threshold=DISCOUNT_THRESHOLD, graph=None):
     """Check if stock is 35% below 52-week high"""
-    try:
-        all_highs = data['high']
-        all_lows = data['low']
-        current_price = data['close'][-1]
+    if not len(data['close']):
+        return False
 
-        year_high = max(all_highs)
-        year_low = min(all_lows)
+    graph = graph or indicators.IndicatorGraph(data)
+    current_price = data['close'][-1]
 
-        if year_high == year_low:
-            return False
+    year_high = graph.highest('high')
+    year_low = graph.lowest('low')
 
-        discount_from_high = (year_high - current_price) / year_high
-        return discount_from_high >= 0.35
-    except:
+    if year_high == year_low:
         return False
 
-def is_swing_low(data, window=5):
-    """Check if current price is at swing low"""
-    try:
-        current_low = data['low'][-1]
-        lookback_data = data['low'][-window-1:-1]
-        lookforward_min = min(data['low'][-1:])
+    discount_from_high = (year_high - current_price) / year_high
+    return discount_from_high >= threshold
 
-        if len(data['low']) >= window + 1:
-            if current_low <= min(lookback_data) and current_low <= lookforward_min:
-                return True
-        return False
-    except:
+def is_swing_low(data, window=SWING_WINDOW, graph=None):
+    """Check if current price is at swing low"""
+    if len(data['low']) < window + 1:
         return False
 
-def detect_order_block(data):
-    """Detect Order Blocks"""
-    try:
-        for i in range(len(data['close'])-6, max(len(data['close'])-25, 0), -1):
-            if data['close'][i] < data['open'][i]:
-                bullish_count = 0
-                for j in range(i+1, min(i+6, len(data['close']))):
-                    if data['close'][j] > data['open'][j]:
-                        bullish_count += 1
-                    else:
-                        break
-
-                if 3 <= bullish_count <= 5:
-                    first_bullish_close = data['close'][i+1]
-                    last_bullish_close = data['close'][i+bullish_count]
-                    rally_pct = (last_bullish_close - first_bullish_close) / first_bullish_close
-                    return rally_pct > 0.006
+    graph = graph or indicators.IndicatorGraph(data)
+    current_low = data['low'][-1]
+    lookback_min = graph.lowest('low', window, skip=1)
+    lookforward_min = graph.lowest('low', 1)
+
+    return bool(current_low <= lookback_min and current_low <= lookforward_min)
+
+def screen_smc_daily(datas, threshold=DISCOUNT_THRESHOLD, window=SWING_WINDOW):
+    """evaluate_smc_daily's discount-zone and swing-low gate for many symbols at once (boolean mask)"""
+    m, lengths = screens.stack_ohlc(datas, fields=('high', 'low', 'close'))
+    return (screens.discount_mask(m['high'], m['low'], m['close'], threshold) &
+            screens.swing_low_mask(m['low'], lengths, window))
+
+def detect_order_block(data, graph=None):
+    """Detect Order Blocks: most recent bearish candle 6-24 bars back followed
+    by 3-5 bullish candles that rallied more than 0.6%"""
+    if not len(data['close']):
         return False
-    except:
+
+    graph = graph or indicators.IndicatorGraph(data)
+    return bool(screens.order_block_series(data['open'], data['close'], run=graph.run_lengths(),
+                                           bearish=graph.bearish())[-1])
+
+def detect_fair_value_gap(data, graph=None):
+    """Detect Fair Value Gap: most recent run of 3-6 bullish candles starting
+    7-14 bars back, answered by a bearish candle"""
+    if not len(data['close']):
         return False
 
-def detect_fair_value_gap(data):
-    """Detect Fair Value Gap"""
-    try:
-        for i in range(len(data['close'])-7, max(len(data['close'])-15, 0), -1):
-            bullish_count = 0
-            end_index = min(i+6, len(data['close'])-1)
-            for j in range(i, end_index):
-                if data['close'][j] > data['open'][j]:
-                    bullish_count += 1
-                else:
-                    break
-
-            if 3 <= bullish_count <= 6:
-                next_candle_idx = i + bullish_count
-                if next_candle_idx < len(data['close']):
-                    return data['close'][next_candle_idx] < data['open'][next_candle_idx]
+    graph = graph or indicators.IndicatorGraph(data)
+    return bool(screens.fair_value_gap_series(data['open'], data['close'], run=graph.run_lengths(),
+                                              bearish=graph.bearish())[-1])
+
+def check_volume_spike(data, graph=None):
+    """Check if volume is 2x average volume"""
+    if len(data['volume']) < 10:
         return False
-    except:
+
+    graph = graph or indicators.IndicatorGraph(data)
+    current_volume = data['volume'][-1]
+    avg_volume = graph.volume_mean(10)
+
+    if avg_volume == 0:
         return False
 
-def check_volume_spike(data):
-    """Check if volume is 2x average volume"""
-    try:
-        if len(data['volume']) < 10:
-            return False
+    return current_volume >= avg_volume * 2.0
 
-        current_volume = data['volume'][-1]
-        recent_volumes = data['volume'][-10:]
-        avg_volume = sum(recent_volumes) / len(recent_volumes)
+def evaluate_smc_daily(symbol, data):
+    """SMC analysis on already-fetched daily data (raises on bad input)"""
+    # Gate first: the confluence checks only matter for discounted swing lows
+    graph = indicators.graph(symbol, '1d', data)
+    if not (calculate_discount_zone(data, graph=graph) and is_swing_low(data, graph=graph)):
+        return None
 
-        if avg_volume == 0:
-            return False
+    order_block = detect_order_block(data, graph)
+    fvg = detect_fair_value_gap(data, graph)
+    volume_spike = check_volume_spike(data, graph)
 
-        return current_volume >= avg_volume * 2.0
-    except:
-        return False
+    return {
+        'symbol': symbol.replace('.NS', ''),
+        'discount_zone': 'Y',
+        'swing_low': 'Y',
+        'order_block': 'Y' if order_block else 'N',
+        'fvg': 'Y' if fvg else 'N',
+        'volume_spike': 'Y' if volume_spike else 'N',
+        'confluence_score': sum([1 for x in [order_block, fvg, volume_spike] if x])
+    }
 
 def analyze_smc_daily(symbol):
     """Complete SMC analysis for daily timeframe"""
@@ -118,23 +125,6 @@ def analyze_smc_daily(symbol):
         data = get_stock_data(symbol, period="1y", interval="1d")
         if data is None:
             return None
-
-        discount_zone = calculate_discount_zone(data)
-        swing_low = is_swing_low(data)
-        order_block = detect_order_block(data)
-        fvg = detect_fair_value_gap(data)
-        volume_spike = check_volume_spike(data)
-
-        if discount_zone and swing_low:
-            return {
-                'symbol': symbol.replace('.NS', ''),
-                'discount_zone': 'Y',
-                'swing_low': 'Y',
-                'order_block': 'Y' if order_block else 'N',
-                'fvg': 'Y' if fvg else 'N',
-                'volume_spike': 'Y' if volume_spike else 'N',
-                'confluence_score': sum([1 for x in [order_block, fvg, volume_spike] if x])
-            }
-        return None
+        return evaluate_smc_daily(symbol, data)
     except:
         return None
@@ -0,0 +1,312 @@
+import json
+import time
+import argparse
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+import market_data
+import resample
+import screens
+import analysis_smc_1d
+import analysis_bajaj_hourly
+import analysis_rsi_mtf
+import analysis_engulfing_4h
+from ohlcv import OHLCV
+from stocks_list import STOCKS_LIST
+warnings.filterwarnings('ignore')
+
+# History replayed per interval (Yahoo serves at most 730 days of intraday bars)
+HISTORY = {'1d': '10y', '1h': '730d', '4h': '730d'}
+
+# Forward-return horizons, in bars of each signal's own timeline
+HORIZONS = {'smc': [1, 5, 10, 20], 'bajaj': [1, 7, 35], 'rsi': [1, 7, 35], 'engulfing': [1, 2, 10]}
+
+# Signal name -> trade direction (+1 long, -1 short) for hit rates
+SIGNALS = {
+    'smc': {'1D-LONG': 1},
+    'bajaj': {'1HR-LONG': 1},
+    'rsi': {'TRIPLE_OVERSOLD': 1, 'TRIPLE_OVERBOUGHT': -1},
+    'engulfing': {'BULLISH': 1, 'BEARISH': -1},
+}
+
+class LookbackIndexer(BaseIndexer):
+    """Rolling window from precomputed start positions up to the current bar"""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        return self.starts.astype(np.int64), np.arange(1, num_values + 1, dtype=np.int64)
+
+def lookback_starts(index, period):
+    """Position of the first bar inside `period` as of each bar (what slice_period keeps live)"""
+    return index.searchsorted(index - market_data.period_to_offset(period))
+
+def rolling(values, starts, how):
+    window = pd.Series(values).rolling(LookbackIndexer(starts=starts), min_periods=1)
+    return getattr(window, how)().to_numpy()
+
+def arrays(frame):
+    return [frame[c].to_numpy(dtype=np.float64) for c in ('Open', 'High', 'Low', 'Close', 'Volume')]
+
+def windowed_wilder_rsi(close, starts, period=14):
+    """calculate_rsi over closes[starts[t]:t+1], for every t at once.
+
+    calculate_rsi seeds on the window's first `period` deltas and then
+    smooths through delta t-1. The smoothing is linear, so the windowed
+    average is alpha^m * seed plus a difference of two full-history
+    exponential sums. That is O(n) overall, with no per-bar loop.
+    NaN where the window holds fewer than period+2 closes.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    t = np.arange(n)
+    alpha = (period - 1) / period
+    deltas = np.diff(close, prepend=close[:1])
+    averages = []
+    for x in (np.where(deltas > 0, deltas, 0.0), np.where(deltas < 0, -deltas, 0.0)):
+        x[0] = 0.0
+        prefix = np.cumsum(x)
+        smoothed = pd.Series(x).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+        s = np.clip(starts, 0, n - 1)
+        seed_end = np.clip(s + period, 0, n - 1)
+        seed = (prefix[seed_end] - prefix[s]) / period
+        updates = t - s - period - 1
+        decay = alpha ** np.maximum(updates, 0)
+        tail = smoothed[np.clip(t - 1, 0, n - 1)] - decay * smoothed[seed_end]
+        averages.append(decay * seed + np.where(updates > 0, tail, 0.0))
+    avg_gain, avg_loss = averages
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    return np.where(t - starts + 1 >= period + 2, rsi, np.nan)
+
+def smc_signals(daily, threshold=0.35, window=5):
+    """analyze_smc_daily as of every daily bar: (signal mask, confluence score)"""
+    open_, high, low, close, volume = arrays(daily)
+    starts = lookback_starts(daily.index, analysis_smc_1d.DATA_REQUIREMENTS['1d'])
+    bars = np.arange(len(close)) - starts + 1
+    period_high = rolling(high, starts, 'max')
+    period_low = rolling(low, starts, 'min')
+    with np.errstate(all='ignore'):
+        discount = ((period_high - close) / period_high >= threshold) & (period_high != period_low)
+    swing_low = low <= pd.Series(low).rolling(window).min().shift(1).to_numpy()
+    signal = (bars >= analysis_smc_1d.MIN_BARS) & discount & swing_low
+
+    order_block = screens.order_block_series(open_, close)
+    fvg = screens.fair_value_gap_series(open_, close)
+    average_volume = pd.Series(volume).rolling(10).mean().to_numpy()
+    volume_spike = (average_volume != 0) & (volume >= average_volume * 2.0)
+    return signal, order_block.astype(int) + fvg.astype(int) + volume_spike.astype(int)
+
+def bajaj_signals(hourly, threshold=0.15, window=10):
+    """analyze_bajaj_hourly as of every hourly bar: (signal mask, order-block mask)"""
+    open_, high, low, close, _ = arrays(hourly)
+    starts = lookback_starts(hourly.index, analysis_bajaj_hourly.DATA_REQUIREMENTS['1h'])
+    bars = np.arange(len(close)) - starts + 1
+    period_high = rolling(high, starts, 'max')
+    with np.errstate(all='ignore'):
+        discount = (period_high - close) / period_high > threshold
+    swing_low = low <= pd.Series(low).rolling(window, min_periods=1).min().shift(1).to_numpy()
+    signal = (bars >= analysis_bajaj_hourly.MIN_BARS) & discount & swing_low
+    order_block = screens.order_block_series(open_, close, newest=10, oldest=100, max_run=14,
+                                             run_bounds=(2, 12), rally_threshold=0.003)
+    return signal, order_block
+
+def engulfing_signals(four_hour):
+    """analyze_engulfing_4h as of every 4H bar: +1 bullish, -1 bearish, 0 none"""
+    fields = arrays(four_hour)[:4]
+    direction = np.zeros(len(four_hour), dtype=int)
+    if len(four_hour) < 3:
+        return direction
+    windows = [np.lib.stride_tricks.sliding_window_view(f, 3) for f in fields]
+    bullish, bearish = screens.engulfing_masks(*windows)
+    starts = lookback_starts(four_hour.index, analysis_engulfing_4h.DATA_REQUIREMENTS['4h'])
+    enough = (np.arange(len(four_hour)) - starts + 1 >= analysis_engulfing_4h.MIN_BARS)[2:]
+    direction[2:] = np.where(bullish & enough, 1, np.where(bearish & enough, -1, 0))
+    return direction
+
+def session_dates(index):
+    local = index.tz_convert(resample.SESSION_TZ) if index.tz is not None else index
+    return local.tz_localize(None).normalize()
+
+def aligned_rsi(daily, four_hour, hourly, period=14):
+    """1D, 4H and 1H RSI as of every hourly bar, one row per timeframe.
+
+    Each hourly bar sees the 4H bar and the session it falls in, exactly
+    as a live scan at that hour would.
+    """
+    rsi = {}
+    for timeframe, frame in (('1D', daily), ('4H', four_hour), ('1H', hourly)):
+        interval = analysis_rsi_mtf.TIMEFRAME_INTERVALS[timeframe]
+        starts = lookback_starts(frame.index, analysis_rsi_mtf.DATA_REQUIREMENTS[interval])
+        values = windowed_wilder_rsi(frame['Close'].to_numpy(dtype=np.float64), starts, period)
+        enough = np.arange(len(frame)) - starts + 1 >= analysis_rsi_mtf.MIN_BARS
+        rsi[timeframe] = np.where(enough, values, np.nan)
+
+    positions = {
+        '1D': session_dates(daily.index).searchsorted(session_dates(hourly.index), side='right') - 1,
+        '4H': four_hour.index.searchsorted(hourly.index, side='right') - 1,
+        '1H': np.arange(len(hourly)),
+    }
+    return [np.where(positions[tf] >= 0, rsi[tf][np.clip(positions[tf], 0, None)], np.nan)
+            if len(rsi[tf]) else np.full(len(hourly), np.nan) for tf in analysis_rsi_mtf.TIMEFRAMES]
+
+def rsi_signals(daily, four_hour, hourly, period=14):
+    """analyze_rsi_mtf as of every hourly bar: +1 triple oversold, -1 triple overbought, 0 none"""
+    aligned = aligned_rsi(daily, four_hour, hourly, period)
+    overbought = np.logical_and.reduce([r >= 70 for r in aligned])
+    oversold = np.logical_and.reduce([r <= 30 for r in aligned])
+    return np.where(oversold, 1, np.where(overbought, -1, 0))
+
+def forward_returns(close, horizon):
+    """close[t + horizon] / close[t] - 1 (NaN past the end of the data)"""
+    close = np.asarray(close, dtype=np.float64)
+    ahead = np.full(len(close), np.nan)
+    if horizon < len(close):
+        ahead[:-horizon] = close[horizon:]
+    return ahead / close - 1
+
+def new_tally(horizons):
+    return {'signals': 0, 'horizons': {h: {'n': 0, 'hits': 0, 'return_sum': 0.0} for h in horizons}}
+
+def tally(totals, mask, direction, close, horizons):
+    """Add one symbol's signals to the running hit-rate totals"""
+    totals['signals'] += int(mask.sum())
+    for h in horizons:
+        ret = forward_returns(close, h)[mask]
+        ret = ret[~np.isnan(ret)]
+        bucket = totals['horizons'][h]
+        bucket['n'] += len(ret)
+        bucket['hits'] += int((ret * direction > 0).sum())
+        bucket['return_sum'] += float(ret.sum())
+
+def summarize(totals):
+    horizons = {}
+    for h, bucket in totals['horizons'].items():
+        n = bucket['n']
+        horizons[str(h)] = {'n': n,
+                            'hit_rate': round(bucket['hits'] / n, 4) if n else None,
+                            'mean_return': round(bucket['return_sum'] / n, 6) if n else None}
+    return {'signals': totals['signals'], 'horizons': horizons}
+
+def load_history(symbols, history=HISTORY, batch_size=None):
+    """{symbol: {'1d', '1h', '4h': frame}} for the replay, downloaded in batches (bypasses the bar cache)"""
+    frames = {s: {} for s in symbols}
+    for interval, period in history.items():
+        if interval in market_data.DERIVED:
+            continue
+        for chunk in market_data.chunks(list(symbols), batch_size or market_data.BATCH_SIZE):
+            for symbol, frame in market_data.download_many(chunk, period, interval).items():
+                frames[symbol][interval] = frame
+    for by_interval in frames.values():
+        for interval, (source, hours) in market_data.DERIVED.items():
+            by_interval[interval] = resample.resample_sessions(by_interval.get(source, pd.DataFrame()), hours)
+    return frames
+
+def replay_symbol(frames, totals, baseline):
+    """Replay all four scanners over one symbol's history and add to the totals"""
+    daily, hourly, four_hour = frames.get('1d'), frames.get('1h'), frames.get('4h')
+    timelines = {'smc': daily, 'bajaj': hourly, 'engulfing': four_hour, 'rsi': hourly}
+    if any(frame is None or frame.empty for frame in (daily, hourly, four_hour)):
+        return False
+
+    directions = {
+        'smc': smc_signals(daily)[0].astype(int),
+        'bajaj': bajaj_signals(hourly)[0].astype(int),
+        'engulfing': engulfing_signals(four_hour),
+        'rsi': rsi_signals(daily, four_hour, hourly),
+    }
+    for name, direction in directions.items():
+        close = timelines[name]['Close'].to_numpy(dtype=np.float64)
+        for signal, sign in SIGNALS[name].items():
+            tally(totals[name][signal], direction == sign, sign, close, HORIZONS[name])
+        tally(baseline[name], np.ones(len(close), dtype=bool), 1, close, HORIZONS[name])
+    return True
+
+def spot_check(symbol, frames, samples=20, seed=0):
+    """Compare replayed signals with the live evaluate_* functions at random bars; returns mismatches"""
+    rng = np.random.default_rng(seed)
+    daily, hourly, four_hour = frames['1d'], frames['1h'], frames['4h']
+
+    def as_of(frame, module, interval, t):
+        """What the live loader would hand the analyzer with bar t as the latest bar"""
+        if t < 0:
+            return None
+        start = lookback_starts(frame.index, module.DATA_REQUIREMENTS[interval])[t]
+        window = frame.iloc[start:t + 1]
+        return OHLCV.from_frame(window) if len(window) >= module.MIN_BARS else None
+
+    def live(evaluate, data):
+        return data is not None and evaluate(symbol, data) is not None
+
+    def live_rsi(t):
+        positions = {'1D': session_dates(daily.index).searchsorted(session_dates(hourly.index[t:t + 1]), side='right')[0] - 1,
+                     '4H': four_hour.index.searchsorted(hourly.index[t], side='right') - 1,
+                     '1H': t}
+        frames_by_tf = {'1D': daily, '4H': four_hour, '1H': hourly}
+        data = {tf: as_of(frames_by_tf[tf], analysis_rsi_mtf, analysis_rsi_mtf.TIMEFRAME_INTERVALS[tf], positions[tf])
+                for tf in analysis_rsi_mtf.TIMEFRAMES}
+        if any(d is None for d in data.values()):
+            return False
+        return analysis_rsi_mtf.evaluate_rsi_mtf(symbol, data) is not None
+
+    checks = [
+        ('smc', daily, smc_signals(daily)[0], lambda t: live(
+            analysis_smc_1d.evaluate_smc_daily, as_of(daily, analysis_smc_1d, '1d', t))),
+        ('bajaj', hourly, bajaj_signals(hourly)[0], lambda t: live(
+            analysis_bajaj_hourly.evaluate_bajaj_hourly, as_of(hourly, analysis_bajaj_hourly, '1h', t))),
+        ('engulfing', four_hour, engulfing_signals(four_hour) != 0, lambda t: live(
+            analysis_engulfing_4h.evaluate_engulfing_4h, as_of(four_hour, analysis_engulfing_4h, '4h', t))),
+        ('rsi', hourly, rsi_signals(daily, four_hour, hourly) != 0, live_rsi),
+    ]
+    mismatches = []
+    for name, frame, replayed, evaluate in checks:
+        picks = set(rng.choice(len(frame), min(samples, len(frame)), replace=False))
+        picks |= set(np.nonzero(replayed)[0][:samples])
+        for t in sorted(picks):
+            if bool(replayed[t]) != evaluate(t):
+                mismatches.append(f"{symbol} {name} @ {frame.index[t]}: replay={bool(replayed[t])}")
+    return mismatches
+
+def run(symbols, output='backtest_results.json', check=0):
+    """Replay every scanner over `symbols` and write forward-return hit rates"""
+    started = time.perf_counter()
+    totals = {name: {signal: new_tally(HORIZONS[name]) for signal in signals} for name, signals in SIGNALS.items()}
+    baseline = {name: new_tally(HORIZONS[name]) for name in SIGNALS}
+    replayed = 0
+    mismatches = []
+
+    for chunk in market_data.chunks(list(symbols), market_data.BATCH_SIZE):
+        history = load_history(chunk)
+        for symbol in chunk:
+            if replay_symbol(history[symbol], totals, baseline):
+                replayed += 1
+                if check:
+                    mismatches += spot_check(symbol, history[symbol], check)
+        print(f"   [{replayed:4d}/{len(symbols)}] symbols replayed")
+
+    report = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'symbols': len(symbols),
+        'replayed': replayed,
+        'history': HISTORY,
+        'seconds': round(time.perf_counter() - started, 2),
+        'signals': {name: {signal: summarize(t) for signal, t in by_signal.items()}
+                    for name, by_signal in totals.items()},
+        'baseline': {name: summarize(t) for name, t in baseline.items()},
+    }
+    if check:
+        report['spot_check_mismatches'] = mismatches
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Backtest written to {output}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay the four scanners over history and report hit rates')
+    parser.add_argument('--symbols', type=int, default=None, help='only the first N stocks')
+    parser.add_argument('--output', default='backtest_results.json')
+    parser.add_argument('--check', type=int, default=0, help='spot-check N random bars per symbol against the live functions')
+    args = parser.parse_args()
+    run(STOCKS_LIST[:args.symbols], args.output, args.check)
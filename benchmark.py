@@ -0,0 +1,236 @@
+import sys
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import market_data
+import ohlcv_cache
+import memo
+import pipeline
+import indicators
+import telemetry
+from main import format_results
+from stocks_list import STOCKS_LIST
+
+# Universe sizes run by default
+SIZES = [209, 2000, 10000]
+
+# Yahoo-style hourly bar starts within the 09:15-15:30 IST session
+HOURLY_SLOTS = [(h, 15) for h in range(9, 16)]
+
+class SyntheticProvider:
+    """Deterministic stand-in for yf.download.
+
+    Every (symbol, interval) gets a seeded random walk of `bars` candles
+    ending now, cut to the requested period/start, in the same column
+    layout yfinance returns. Each call sleeps `latency` seconds and each
+    (symbol, interval) fails with probability `error_rate` (left out of
+    batch results, an empty frame for single downloads), like Yahoo's
+    failed downloads. Failures are seeded too, so repeated passes agree.
+    """
+
+    def __init__(self, bars=600, latency=0.0, error_rate=0.0, seed=0):
+        self.bars = bars
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.calls = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def index(self, interval):
+        if interval not in self._indexes:
+            now = pd.Timestamp.now(tz='Asia/Kolkata')
+            if interval == '1d':
+                index = pd.bdate_range(end=now.tz_localize(None).normalize(), periods=self.bars)
+            else:
+                step = 4 if interval == '4h' else 1
+                slots = HOURLY_SLOTS[::step]
+                days = pd.bdate_range(end=now.tz_localize(None).normalize(), periods=self.bars // len(slots) + 1)
+                index = pd.DatetimeIndex([d + pd.Timedelta(hours=h, minutes=m) for d in days for h, m in slots])
+                index = index.tz_localize('Asia/Kolkata')
+                index = index[index <= now][-self.bars:]
+            self._indexes[interval] = index
+        return self._indexes[interval]
+
+    def frame(self, symbol, interval):
+        index = self.index(interval)
+        n = len(index)
+        rng = np.random.default_rng(zlib.crc32(f'{self.seed}|{symbol}|{interval}'.encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        open_ = close * (1 + rng.normal(0, 0.01, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+        volume = rng.integers(1000, 100000, n).astype(np.float64)
+        return pd.DataFrame({'Close': close, 'High': high, 'Low': low, 'Open': open_, 'Volume': volume}, index=index)
+
+    def fails(self, symbol, interval):
+        failed = zlib.crc32(f'fail|{self.seed}|{symbol}|{interval}'.encode()) / 2 ** 32 < self.error_rate
+        with self._lock:
+            self.failed += failed
+        return failed
+
+    def __call__(self, tickers, period=None, interval='1d', start=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        index = self.index(interval)
+        if start is None:
+            start = market_data.period_start(period, pd.Timestamp.now(tz='Asia/Kolkata'))
+        start = pd.Timestamp(start)
+        if index.tz is None and start.tz is not None:
+            start = start.tz_convert('Asia/Kolkata').tz_localize(None)
+
+        def cut(symbol):
+            frame = self.frame(symbol, interval)
+            return frame[frame.index >= start]
+
+        if isinstance(tickers, str):
+            frame = cut(tickers) if not self.fails(tickers, interval) else self.frame(tickers, interval).iloc[:0]
+            frame.columns = pd.MultiIndex.from_product([frame.columns, [tickers]], names=['Price', 'Ticker'])
+            return frame
+        frames = {t: cut(t) for t in tickers if not self.fails(t, interval)}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1, names=['Ticker', 'Price'])
+
+def universe(size):
+    """The real F&O list, padded with synthetic symbols up to `size`"""
+    symbols = list(STOCKS_LIST[:size])
+    symbols += [f'SYN{i:05d}.NS' for i in range(size - len(symbols))]
+    return symbols
+
+def timed(stages, name, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    stages[name] = round(time.perf_counter() - start, 4)
+    return result
+
+def evaluate_all(name, evaluate, symbols, inputs):
+    """One analyzer over the whole universe, the way the pipeline would run it"""
+    if name in pipeline.UNIVERSE_ANALYZERS:
+        return pipeline.UNIVERSE_ANALYZERS[name](symbols, inputs)
+    outcomes = []
+    for symbol, data in zip(symbols, inputs):
+        try:
+            outcomes.append(evaluate(symbol, data) if data is not None else None)
+        except Exception:
+            outcomes.append(None)
+    return outcomes
+
+def load_inputs(symbols, analyzers):
+    """Each analyzer's inputs for every symbol, and the seconds each analyzer's loader took.
+
+    Loaders do their conversion (and RSI's resampling) eagerly, so their
+    time belongs to the analyzer rather than to a shared conversion stage.
+    """
+    loaders = {name: loader for name, loader, _ in pipeline.ANALYZERS if name in analyzers}
+    inputs = {name: [] for name in loaders}
+    seconds = {name: 0.0 for name in loaders}
+    for symbol in symbols:
+        for name, loader in loaders.items():
+            start = time.perf_counter()
+            inputs[name].append(loader(symbol))
+            seconds[name] += time.perf_counter() - start
+        market_data.STORE.release(symbol)
+        indicators.release(symbol)
+    return inputs, seconds
+
+def run_stages(symbols):
+    """Time fetch, each analyzer (loading its inputs plus evaluating them) and format_results separately"""
+    analyzers = [name for name, _, _ in pipeline.ANALYZERS]
+    stages = {}
+    market_data.STORE.clear()
+
+    timed(stages, 'fetch', market_data.STORE.prefetch, symbols, pipeline.download_intervals(analyzers))
+    inputs, loading = load_inputs(symbols, analyzers)
+
+    results = {}
+    for name, _, evaluate in pipeline.ANALYZERS:
+        outcomes = timed(stages, name, evaluate_all, name, evaluate, symbols, inputs[name])
+        stages[name] = round(stages[name] + loading[name], 4)
+        results[name] = [r for r in outcomes if r]
+    stages['loading'] = {name: round(seconds, 4) for name, seconds in loading.items()}
+
+    message = timed(stages, 'format_results', format_results, results['smc'], results['bajaj'],
+                    results['rsi'], results['engulfing'], len(symbols))
+    return stages, results, len(message)
+
+def run_size(size, provider, workers):
+    symbols = universe(size)
+    calls, failed, downloads = provider.calls, provider.failed, market_data.STATS['downloads']
+
+    stages, results, message_length = run_stages(symbols)
+
+    # The same scan end to end, with fetch and analysis overlapped
+    market_data.STORE.clear()
+    start = time.perf_counter()
+    piped, pipeline_stats = asyncio.run(pipeline.run(symbols, workers=workers))
+    stages['pipeline_total'] = round(time.perf_counter() - start, 4)
+
+    record = {
+        'symbols': size,
+        'stages': stages,
+        'signals': {name: len(r) for name, r in results.items()},
+        'pipeline_matches_stages': all(piped[name] == results[name] for name in results),
+        'message_length': message_length,
+        'provider_calls': provider.calls - calls,
+        'failed_tickers': provider.failed - failed,
+        'downloads': market_data.STATS['downloads'] - downloads,
+        'arena_peak_mb': round(pipeline_stats['arena']['peak_bytes'] / 2**20, 2) if 'arena' in pipeline_stats else None,
+        'peak_memory_mb': telemetry.peak_memory_mb(),
+    }
+    market_data.STORE.clear()
+    return record
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline scanner benchmark on synthetic OHLCV')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--bars', type=int, default=600, help='candles generated per symbol and interval')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every download call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability a ticker fails to download')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=pipeline.ANALYSIS_WORKERS)
+    parser.add_argument('--rate', type=float, default=None, help='requests/second limit (default: unlimited)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+
+    # Synthetic bars only: no disk cache, no memoized results, no throttling unless asked for
+    ohlcv_cache.ENABLED = False
+    memo.ENABLED = False
+    market_data.LIMITER = market_data.RateLimiter(args.rate or float('inf'))
+    market_data.RETRY.retries = 0  # Injected failures are deterministic; retrying them only adds backoff
+    pipeline.load_analyzers()
+    provider = SyntheticProvider(args.bars, args.latency, args.error_rate, args.seed)
+    yf.download = provider
+
+    runs = []
+    for size in args.sizes:
+        print(f"⏱️ Benchmarking {size} symbols...")
+        record = run_size(size, provider, args.workers)
+        print(f"   {record['stages']}")
+        runs.append(record)
+
+    report = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
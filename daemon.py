@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import pandas as pd
+import schedule
+
+import market_data
+import pipeline
+import freshness
+import resample
+import rsi_state
+import memo
+import signal_store
+from telemetry import TELEMETRY
+
+# Seconds to wait after a candle closes before scanning, so Yahoo has published it
+BAR_DELAY = int(os.getenv('NSE_BAR_DELAY', '90'))
+
+# Longest sleep between scheduler checks
+MAX_SLEEP = 60
+
+def display_symbol(symbol):
+    return symbol.replace('.NS', '')
+
+def next_bar_close(intervals, now=None):
+    """Earliest NSE candle close of any of `intervals` after `now` (None if none within 10 days)"""
+    now = now or pd.Timestamp.now(tz='UTC')
+    closes = [c for interval in intervals
+              for c in freshness.bar_closes(interval, now, now + pd.Timedelta(days=10)) if c > now]
+    return min(closes) if closes else None
+
+class Scanner:
+    """Resident scan state: a warm bar store, RSI state and every symbol's last signals.
+
+    Each scan re-runs only the analyzers whose timeframes had a candle
+    close, tops up the held bars with a delta request, and re-analyzes only
+    the symbols whose bars changed; everyone else keeps their signals.
+    """
+
+    def __init__(self, symbols, format_results, send, diff=True):
+        self.symbols = list(symbols)
+        self.format_results = format_results
+        self.send = send
+        self.diff = diff
+        pipeline.load_analyzers()
+        self.state = None
+        self.signals = {name: {} for name, _, _ in pipeline.ANALYZERS}
+        self.sent = None
+        self.rsi_store = rsi_state.RSIStateStore() if rsi_state.ENABLED else None
+        self.memo_store = memo.MemoStore() if memo.ENABLED else None
+        market_data.STORE.resident = True
+
+    def results(self):
+        """Current signals per analyzer, in universe order"""
+        return {name: [signals[display_symbol(s)] for s in self.symbols if display_symbol(s) in signals]
+                for name, signals in self.signals.items()}
+
+    async def retry_refresh(self):
+        """Refresh the keys whose refresh failed as their backoff (and any breaker cooldown) runs out"""
+        changed = set()
+        while market_data.RETRY.next_due() is not None:
+            due = max(market_data.RETRY.next_due(), market_data.BREAKER.reopens_at() or 0)
+            await asyncio.sleep(max(0, due - time.monotonic()))
+            for interval, symbols in market_data.RETRY.ready().items():
+                changed |= market_data.STORE.refresh(symbols, [interval])
+        return changed
+
+    async def scan(self):
+        TELEMETRY.reset()
+        now = pd.Timestamp.now(tz='UTC')
+        to_run, _ = freshness.plan(pipeline.ANALYZER_INTERVALS, self.state, self.symbols, now)
+        if not to_run:
+            print("⏭️ No candle closed for any analyzer, skipping")
+            return
+
+        with TELEMETRY.stage('refresh'):
+            market_data.RETRY.reset()
+            changed = market_data.STORE.refresh(self.symbols, pipeline.download_intervals(to_run))
+            changed |= await self.retry_refresh()
+        missing = market_data.RETRY.report()['missing']
+        if missing:
+            print(f"🚫 Not refreshed after retries: {len(missing)} symbols, keeping their last bars")
+        symbols = [s for s in self.symbols if s in changed]
+        print(f"🔄 {len(symbols)}/{len(self.symbols)} symbols have new bars ({', '.join(to_run)})")
+
+        if symbols:
+            with TELEMETRY.stage('scan'):
+                fresh, stats = await pipeline.run(symbols, analyzers=to_run, prefetch=False,
+                                                 rsi_store=self.rsi_store, memo_store=self.memo_store)
+            TELEMETRY.extra['pipeline'] = stats
+            rescanned = {display_symbol(s) for s in symbols}
+            for name in to_run:
+                signals = {k: v for k, v in self.signals[name].items() if k not in rescanned}
+                signals.update({result['symbol']: result for result in fresh[name]})
+                self.signals[name] = signals
+
+        results = self.results()
+        self.state = {'last_run': now.isoformat(), 'universe': freshness.universe_key(self.symbols), 'results': results}
+        freshness.record_run(results, self.symbols, now)
+        # A closed candle that brought no new bar (a holiday) is not a run for the streaks
+        if signal_store.ENABLED and symbols:
+            try:
+                signal_store.record({name: results[name] for name in to_run}, self.state['universe'],
+                                    now.isoformat(timespec='seconds'))
+            except Exception as e:
+                print(f"⚠️ Signal store not updated: {e}")
+
+        if results != self.sent:
+            message = self.format_results(results['smc'], results['bajaj'], results['rsi'],
+                                          results['engulfing'], len(self.symbols),
+                                          previous=self.sent if self.diff else None)
+            with TELEMETRY.stage('send'):
+                if await self.send(message):
+                    self.sent = results
+                    freshness.record_sent(results, self.symbols)
+                    print("✅ Telegram message sent successfully!")
+        else:
+            print("📭 Signals unchanged, no message sent")
+        TELEMETRY.save(symbols=len(self.symbols), rescanned=len(symbols), analyzers=to_run)
+
+def run_forever(symbols, format_results, send, diff=True):
+    """Scan once now, then again shortly after every NSE candle close"""
+    scanner = Scanner(symbols, format_results, send, diff)
+    intervals = sorted({i for intervals in pipeline.ANALYZER_INTERVALS.values() for i in intervals})
+
+    def scan():
+        try:
+            asyncio.run(scanner.scan())
+        except Exception as e:
+            print(f"❌ Scan failed: {e}")
+
+    def arm():
+        close = next_bar_close(intervals)
+        if close is None:
+            print("⚠️ No NSE session in the next 10 days, checking again tomorrow")
+            schedule.every(1).days.do(fire)
+            return
+        due = close + pd.Timedelta(seconds=BAR_DELAY)
+        delay = max(1, int((due - pd.Timestamp.now(tz='UTC')).total_seconds()))
+        schedule.every(delay).seconds.do(fire)
+        print(f"⏰ Next scan at {due.tz_convert(resample.SESSION_TZ):%Y-%m-%d %H:%M:%S} IST")
+
+    def fire():
+        scan()
+        arm()
+        return schedule.CancelJob
+
+    print(f"🟢 Daemon started for {len(scanner.symbols)} stocks")
+    scan()
+    arm()
+    while True:
+        schedule.run_pending()
+        idle = schedule.idle_seconds()
+        time.sleep(MAX_SLEEP if idle is None else min(max(idle, 0), MAX_SLEEP))
@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+import ohlcv_cache
+
+# Last successful run and its signals, kept next to the bar cache
+STATE_PATH = os.path.join(ohlcv_cache.CACHE_DIR, 'run_state.json') if ohlcv_cache.ENABLED else None
+
+# Set NSE_FORCE_FULL=1 to ignore freshness and rescan everything
+FORCE_FULL = os.getenv('NSE_FORCE_FULL', '0') == '1'
+
+# Candle length per interval (None = one candle per session)
+INTERVAL_HOURS = {'1h': 1, '4h': 4, '1d': None}
+
+def universe_key(symbols):
+    return hashlib.sha1('|'.join(symbols).encode()).hexdigest()
+
+def tagged_path(tag, path=STATE_PATH):
+    """A separate state file per tag (e.g. shard), so runs sharing a cache keep their own baseline"""
+    if not path or not tag:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{tag}{ext}"
+
+def load_state(path=STATE_PATH):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def save_state(state, path=STATE_PATH):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def last_sent(state, symbols):
+    """The signals last sent to Telegram if they covered the same universe, else None"""
+    sent = (state or {}).get('sent')
+    if not sent or sent.get('universe') != universe_key(symbols):
+        return None
+    return sent['results']
+
+def record_sent(results, symbols, path=STATE_PATH):
+    """Remember the signals just sent, the baseline the next message is diffed against"""
+    if not path:
+        return
+    state = load_state(path) or {}
+    state['sent'] = {'universe': universe_key(symbols), 'results': results}
+    save_state(state, path)
+
+def bar_closes(interval, start, end):
+    """Every NSE candle close for `interval` between two UTC timestamps (inclusive)"""
+    import pandas as pd  # pandas and the exchange calendar only load for runs that plan or record
+    import resample
+    first, last = (pd.Timestamp(t.tz_convert(resample.SESSION_TZ).date()) for t in (start, end))
+    schedule = resample.sessions(first, last).loc[first:last]
+    hours = INTERVAL_HOURS[interval]
+    closes = []
+    for session_open, session_close in zip(schedule['market_open'], schedule['market_close']):
+        if hours is not None:
+            step = pd.Timedelta(hours=hours)
+            edge = session_open + step
+            while edge < session_close:
+                closes.append(edge)
+                edge += step
+        closes.append(session_close)
+    return [c for c in closes if start <= c <= end]
+
+def new_bar_closed(interval, since, now):
+    """True if an `interval` candle closed after `since` and at or before `now`"""
+    return any(c > since for c in bar_closes(interval, since, now))
+
+def plan(analyzer_intervals, state, symbols, now=None):
+    """Split analyzers into (to_run, to_reuse).
+
+    An analyzer is reused when the previous run scanned the same universe
+    and none of its intervals has had a candle close since then.
+    """
+    import pandas as pd
+    now = now or pd.Timestamp.now(tz='UTC')
+    if FORCE_FULL or state is None or state.get('universe') != universe_key(symbols):
+        return list(analyzer_intervals), []
+
+    since = pd.Timestamp(state['last_run'])
+    fresh = {interval: new_bar_closed(interval, since, now)
+             for intervals in analyzer_intervals.values() for interval in intervals}
+
+    to_run, to_reuse = [], []
+    for name, intervals in analyzer_intervals.items():
+        if name in state.get('results', {}) and not any(fresh[i] for i in intervals):
+            to_reuse.append(name)
+        else:
+            to_run.append(name)
+    return to_run, to_reuse
+
+def record_run(results, symbols, now=None, path=STATE_PATH, rescan=()):
+    """Persist this run's signals as the baseline for the next freshness check.
+
+    `rescan` lists symbols this run could not analyze (their fetch gave up
+    or an analyzer failed on them); the next run scans them again even for
+    analyzers whose signals it otherwise reuses.
+    """
+    if not path:
+        return
+    import pandas as pd
+    now = now or pd.Timestamp.now(tz='UTC')
+    state = {'last_run': now.isoformat(), 'universe': universe_key(symbols), 'results': results,
+             'rescan': sorted(rescan)}
+    sent = (load_state(path) or {}).get('sent')
+    if sent:
+        state['sent'] = sent
+    save_state(state, path)
+
+def pending(state, symbols):
+    """Symbols the last run of this universe could not analyze, in universe order"""
+    if state is None or state.get('universe') != universe_key(symbols):
+        return []
+    rescan = set(state.get('rescan', []))
+    return [symbol for symbol in symbols if symbol in rescan]
@@ -0,0 +1,130 @@
+import numpy as np
+import screens
+from ohlcv import OHLCV
+
+# Most (symbol, interval) graphs a process holds before dropping the oldest
+MAX_GRAPHS = 512
+
+# Root graph per (symbol, interval), over the longest bars seen for it
+GRAPHS = {}
+
+class IndicatorGraph:
+    """Memoized building blocks over one symbol's bars at one timeframe.
+
+    Each node (candle direction, bullish run lengths, extremes, close
+    deltas, Wilder RSI, volume means) is computed once and shared by every
+    check and analyzer that asks for it. A window over the most recent
+    bars (a shorter lookback of the same data) slices its parent's
+    direction, run and delta series instead of recomputing them; nodes
+    that depend on where the window starts are kept per window.
+    """
+
+    def __init__(self, data, parent=None):
+        self.data = data
+        self.parent = parent
+        self.nodes = {}
+        self.windows = {}
+
+    def node(self, key, compute):
+        if key not in self.nodes:
+            self.nodes[key] = compute()
+        return self.nodes[key]
+
+    def series(self, name, compute):
+        """A per-bar node whose values over the last n bars are the last n of the full series"""
+        if self.parent is not None:
+            return self.parent.series(name, compute)[len(self.parent.data) - len(self.data):]
+        return self.node(name, lambda: compute(self))
+
+    def covers(self, data):
+        """True if `data` is these bars or their most recent part"""
+        n = len(data)
+        if n == 0 or n > len(self.data):
+            return False
+        tail = self.data.tail(n)
+        return (np.array_equal(tail.timestamps, data.timestamps) and
+                all(np.array_equal(tail[f], data[f]) for f in OHLCV.FIELDS))
+
+    def window(self, data):
+        """Graph over `data`, the last len(data) of these bars"""
+        if len(data) == len(self.data):
+            return self
+        if len(data) not in self.windows:
+            self.windows[len(data)] = IndicatorGraph(data, self)
+        return self.windows[len(data)]
+
+    def bullish(self):
+        return self.series('bullish', lambda g: g.data['close'] > g.data['open'])
+
+    def bearish(self):
+        return self.series('bearish', lambda g: g.data['close'] < g.data['open'])
+
+    def run_lengths(self):
+        """Consecutive bullish candles starting at each bar"""
+        return self.series('run_lengths', lambda g: screens.run_lengths(g.bullish()))
+
+    def deltas(self):
+        return self.series('deltas', lambda g: np.diff(np.asarray(g.data['close'], dtype=np.float64)))
+
+    def gains(self):
+        return self.series('gains', lambda g: np.where(g.deltas() > 0, g.deltas(), 0.0))
+
+    def losses(self):
+        return self.series('losses', lambda g: np.where(g.deltas() < 0, -g.deltas(), 0.0))
+
+    def highest(self, field, window=None, skip=0):
+        """Max of `field` over the `window` bars before the last `skip` (default: all bars)"""
+        return self.node(('highest', field, window, skip), lambda: np.max(self.span(field, window, skip)))
+
+    def lowest(self, field, window=None, skip=0):
+        """Min of `field` over the `window` bars before the last `skip` (default: all bars)"""
+        return self.node(('lowest', field, window, skip), lambda: np.min(self.span(field, window, skip)))
+
+    def span(self, field, window, skip):
+        values = self.data[field]
+        end = len(values) - skip
+        return values[:end] if window is None else values[-(window + skip):end]
+
+    def volume_mean(self, window=10):
+        """Mean volume of the last `window` bars"""
+        def compute():
+            recent = self.data['volume'][-window:]
+            return sum(recent) / len(recent)
+        return self.node(('volume_mean', window), compute)
+
+    def rsi(self, period=14):
+        """calculate_rsi's Wilder RSI for these bars (None while there are too few)"""
+        def compute():
+            if len(self.data['close']) < period + 1:
+                return None
+            gains = self.gains().tolist()
+            losses = self.losses().tolist()
+            avg_gain = sum(gains[:period]) / period
+            avg_loss = sum(losses[:period]) / period
+            rsi = None
+            for i in range(period, len(gains)):
+                rsi = 100 if avg_loss == 0 else 100 - (100 / (1 + avg_gain / avg_loss))
+                avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+                avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+            return rsi
+        return self.node(('rsi', period), compute)
+
+def graph(symbol, interval, data):
+    """The shared graph for `data`, one symbol's bars at `interval` (or a recent window of them).
+
+    A graph over longer bars ending at the same bar serves shorter
+    lookbacks; anything else replaces it.
+    """
+    key = (symbol, interval)
+    root = GRAPHS.get(key)
+    if root is None or not root.covers(data):
+        GRAPHS.pop(key, None)
+        root = GRAPHS[key] = IndicatorGraph(data)
+        while len(GRAPHS) > MAX_GRAPHS:
+            GRAPHS.pop(next(iter(GRAPHS)))
+    return root.window(data)
+
+def release(symbol):
+    """Drop a symbol's graphs once it is analyzed"""
+    for key in [k for k in list(GRAPHS) if k[0] == symbol]:
+        GRAPHS.pop(key, None)
@@ -1,27 +1,38 @@
+import time
+IMPORT_START = time.perf_counter()
+
 import os
+import sys
+import json
 import asyncio
-import time
-from datetime import datetime, timedelta
-import pandas_market_calendars as mcal
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime
 import pytz
 
-# Import analysis modules
-from stocks_list import STOCKS_LIST
-from analysis_smc_1d import analyze_smc_daily
-from analysis_bajaj_hourly import analyze_bajaj_hourly
-from analysis_rsi_mtf import analyze_rsi_mtf
-from analysis_engulfing_4h import analyze_engulfing_4h
+# The scan pipeline (with market_data and yfinance) is imported by the paths that scan,
+# and the analyzers themselves on selection, see pipeline.load_analyzers
+import freshness
+import signal_store
+import shards
+import telemetry
+from telemetry import TELEMETRY
+from stocks_list import STOCKS_LIST, get_universe, to_yahoo
+
+# Seconds spent importing this module's dependencies, reported as part of startup
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
 
 # Telegram Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
-# Import telegram
-from telegram import Bot
+# Mark signals NEW/CONTINUING/DROPPED against the previous run (NSE_SIGNAL_DIFF=0 lists everything)
+SIGNAL_DIFF = os.getenv('NSE_SIGNAL_DIFF', '1') == '1'
 
 async def send_telegram_message(message):
     """Send message to Telegram (async) - ONE MESSAGE ONLY"""
     try:
+        from telegram import Bot  # Imported here so dry runs skip it
         bot = Bot(token=TELEGRAM_BOT_TOKEN)
         await bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message, parse_mode='HTML')
         return True
@@ -29,80 +40,119 @@ async def send_telegram_message(message):
         print(f"❌ Telegram error: {e}")
         return False
 
-def format_results(smc_results, bajaj_results, rsi_results, engulfing_results, total_stocks):
-    """Format all analysis results into ONE comprehensive message with requested formatting"""
+# Most symbols listed on the one-line CONTINUING/DROPPED rows of a diffed message
+DIFF_NAMES = 30
+
+def symbol_list(symbols):
+    """Comma-separated symbols, capped at DIFF_NAMES"""
+    shown = ', '.join(symbols[:DIFF_NAMES])
+    return shown + (f" +{len(symbols) - DIFF_NAMES} more" if len(symbols) > DIFF_NAMES else '')
+
+def format_signals(stocks, limit, line, previous=None):
+    """Message lines for one signal list; `line` renders one stock.
+
+    With the `previous` run's list, only NEW signals get full lines;
+    CONTINUING and DROPPED symbols are summarized on one line each.
+    """
+    if previous is None:
+        text = ''.join(f"• {line(stock)}\n" for stock in stocks[:limit])
+        if len(stocks) > limit:
+            text += f"... and {len(stocks) - limit} more\n"
+        return text
+    
+    before = {stock['symbol'] for stock in previous}
+    now = {stock['symbol'] for stock in stocks}
+    new = [stock for stock in stocks if stock['symbol'] not in before]
+    continuing = [stock['symbol'] for stock in stocks if stock['symbol'] in before]
+    dropped = [stock['symbol'] for stock in previous if stock['symbol'] not in now]
+    text = ''.join(f"🆕 {line(stock)}\n" for stock in new[:limit])
+    if len(new) > limit:
+        text += f"... and {len(new) - limit} more new\n"
+    if continuing:
+        text += f"• Continuing: {symbol_list(continuing)}\n"
+    if dropped:
+        text += f"➖ Dropped: {symbol_list(dropped)}\n"
+    return text
+
+def smc_line(stock):
+    signals = []
+    if stock['order_block'] == 'Y': signals.append('OB')
+    if stock['fvg'] == 'Y': signals.append('FVG')
+    if stock['volume_spike'] == 'Y': signals.append('VOLx2')
+    return f"{stock['symbol']}: {stock['confluence_score']}/3 → {', '.join(signals)}"
+
+def bajaj_line(stock):
+    return f"{stock['symbol']}: OB={stock['ob']}, Score={stock['confluence_score']}"
+
+def rsi_line(stock):
+    # Format: symbol: 1D_RSI-4H_RSI-1H_RSI (no color balls, just numbers)
+    return f"{stock['symbol']}: {stock['1D_RSI']:.0f}-{stock['4H_RSI']:.0f}-{stock['1H_RSI']:.0f}"
+
+def engulfing_line(stock):
+    # No price/percentage
+    return stock['symbol']
+
+def format_results(smc_results, bajaj_results, rsi_results, engulfing_results, total_stocks, previous=None):
+    """Format all analysis results into ONE comprehensive message with requested formatting.
+
+    `previous` is the last run's {analyzer: signals}; when given, each
+    section marks signals as NEW, CONTINUING or DROPPED. Each list is
+    ranked best first (signal_store.SCORES) before it is truncated.
+    """
     # Time in 12-hour AM/PM format
     current_time = datetime.now(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %I:%M %p')
     
+    def before(name, keep=lambda stock: True):
+        if previous is None:
+            return None
+        return [stock for stock in previous.get(name) or [] if keep(stock)]
+    
     message = f"<b>📊 NSE STOCK ANALYSIS - {current_time}</b>\n"
     message += "═" * 50 + "\n\n"
     
     # 1. SMC DAILY ANALYSIS - Changed to "1D-LONG"
-    if smc_results:
+    if smc_results or before('smc'):
         message += "<b>🎯 1D-LONG (35% Discount + Swing Low):</b>\n"
-        for stock in smc_results[:15]:  # Increased to 15
-            signals = []
-            if stock['order_block'] == 'Y': signals.append('OB')
-            if stock['fvg'] == 'Y': signals.append('FVG')
-            if stock['volume_spike'] == 'Y': signals.append('VOLx2')
-            
-            message += f"• {stock['symbol']}: {stock['confluence_score']}/3 → {', '.join(signals)}\n"
-        if len(smc_results) > 15:
-            message += f"... and {len(smc_results) - 15} more\n"
+        message += format_signals(signal_store.ranked('smc', smc_results), 15, smc_line, before('smc'))  # Increased to 15
         message += f"<i>Total: {len(smc_results)}</i>\n\n"
     
     # 2. BAJAJ HOURLY ANALYSIS - Changed to "1HR-LONG"
-    if bajaj_results:
+    if bajaj_results or before('bajaj'):
         message += "<b>⏰ 1HR-LONG (15% Discount):</b>\n"
-        for stock in bajaj_results[:15]:  # Increased to 15
-            message += f"• {stock['symbol']}: OB={stock['ob']}, Score={stock['confluence_score']}\n"
-        if len(bajaj_results) > 15:
-            message += f"... and {len(bajaj_results) - 15} more\n"
+        message += format_signals(signal_store.ranked('bajaj', bajaj_results), 15, bajaj_line, before('bajaj'))  # Increased to 15
         message += f"<i>Total: {len(bajaj_results)}</i>\n\n"
     
     # 3. RSI MULTI-TIMEFRAME - Simplified formatting
-    if rsi_results:
-        oversold = [r for r in rsi_results if 'OVERSOLD' in r.get('confluence', '')]
-        overbought = [r for r in rsi_results if 'OVERBOUGHT' in r.get('confluence', '')]
+    if rsi_results or before('rsi'):
+        is_oversold = lambda r: 'OVERSOLD' in r.get('confluence', '')
+        is_overbought = lambda r: 'OVERBOUGHT' in r.get('confluence', '')
+        oversold = [r for r in rsi_results if is_oversold(r)]
+        overbought = [r for r in rsi_results if is_overbought(r)]
         
-        if oversold:
+        if oversold or before('rsi', is_oversold):
             message += "<b>🟢 TRIPLE OVERSOLD:</b>\n"
-            for stock in oversold[:10]:  # Show more stocks
-                # Format: symbol: 1D_RSI-4H_RSI-1H_RSI (no color balls, just numbers)
-                rsi_values = f"{stock['1D_RSI']:.0f}-{stock['4H_RSI']:.0f}-{stock['1H_RSI']:.0f}"
-                message += f"• {stock['symbol']}: {rsi_values}\n"
-            if len(oversold) > 10:
-                message += f"... and {len(oversold) - 10} more\n"
+            message += format_signals(signal_store.ranked('rsi', oversold), 10, rsi_line, before('rsi', is_oversold))  # Show more stocks
         
-        if overbought:
+        if overbought or before('rsi', is_overbought):
             message += "<b>🔴 TRIPLE OVERBOUGHT:</b>\n"
-            for stock in overbought[:10]:  # Show more stocks
-                # Format: symbol: 1D_RSI-4H_RSI-1H_RSI (no color balls, just numbers)
-                rsi_values = f"{stock['1D_RSI']:.0f}-{stock['4H_RSI']:.0f}-{stock['1H_RSI']:.0f}"
-                message += f"• {stock['symbol']}: {rsi_values}\n"
-            if len(overbought) > 10:
-                message += f"... and {len(overbought) - 10} more\n"
+            message += format_signals(signal_store.ranked('rsi', overbought), 10, rsi_line, before('rsi', is_overbought))  # Show more stocks
         
         message += f"<i>Total triple alignments: {len(rsi_results)}</i>\n\n"
     
     # 4. 4H ENGULFING - Simplified formatting
-    if engulfing_results:
-        bullish = [r for r in engulfing_results if r['pattern'] == 'BULLISH']
-        bearish = [r for r in engulfing_results if r['pattern'] == 'BEARISH']
+    if engulfing_results or before('engulfing'):
+        is_bullish = lambda r: r['pattern'] == 'BULLISH'
+        is_bearish = lambda r: r['pattern'] == 'BEARISH'
+        bullish = [r for r in engulfing_results if is_bullish(r)]
+        bearish = [r for r in engulfing_results if is_bearish(r)]
         
-        if bullish:
+        if bullish or before('engulfing', is_bullish):
             message += "<b>📈 4H BULLISH ENGULFING:</b>\n"
-            for stock in bullish[:10]:  # Show more stocks, no price/percentage
-                message += f"• {stock['symbol']}\n"
-            if len(bullish) > 10:
-                message += f"... and {len(bullish) - 10} more\n"
+            message += format_signals(signal_store.ranked('engulfing', bullish), 10, engulfing_line, before('engulfing', is_bullish))  # Show more stocks
         
-        if bearish:
+        if bearish or before('engulfing', is_bearish):
             message += "<b>📉 4H BEARISH ENGULFING:</b>\n"
-            for stock in bearish[:10]:  # Show more stocks, no price/percentage
-                message += f"• {stock['symbol']}\n"
-            if len(bearish) > 10:
-                message += f"... and {len(bearish) - 10} more\n"
+            message += format_signals(signal_store.ranked('engulfing', bearish), 10, engulfing_line, before('engulfing', is_bearish))  # Show more stocks
         
         message += f"<i>Total engulfing patterns: {len(engulfing_results)}</i>\n\n"
     
@@ -119,70 +169,212 @@ def format_results(smc_results, bajaj_results, rsi_results, engulfing_results, t
     
     return message
 
-async def analyze_all_stocks():
-    """Analyze ALL 209 stocks silently"""
-    print(f"🔍 Analyzing ALL {len(STOCKS_LIST)} stocks...")
+def report_stats(stats):
+    """Log one pipeline run's outcome"""
+    print(f"✅ Analysis complete! Analyzed: {stats['analyzed']}, Errors: {TELEMETRY.failed_symbols()}")
+    if TELEMETRY.failures:
+        print(f"   Failures by kind: {TELEMETRY.report()['failures']['by_kind']}")
+    if stats['fetch']['recovered']:
+        print(f"🔁 Fetches recovered by retry: {stats['fetch']['recovered']}/{stats['fetch']['retried']}")
+    if stats['fetch']['missing']:
+        missing = stats['fetch']['missing']
+        print(f"🚫 Missing after retries: {len(missing)} symbols ({', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''})")
+    if any(stats['gated'].values()):
+        print(f"🧹 Screened out by gates: {', '.join(f'{n} {c}' for n, c in stats['gated'].items() if c)}")
+    if stats['memo']['hits']:
+        print(f"♻️ Memoized results reused: {stats['memo']['hits']}/{stats['memo']['hits'] + stats['memo']['misses']}")
+    if stats['fetches_avoided']:
+        print(f"⚡ Fetches avoided by short-circuiting: {stats['fetches_avoided']} (downloads: {stats['downloads']})")
+
+def merge_rescanned(previous, fresh, symbols, rescanned):
+    """Reused signals with the rescanned symbols' replaced by `fresh`, in universe order"""
+    order = {symbol.replace('.NS', ''): i for i, symbol in enumerate(symbols)}
+    replaced = {symbol.replace('.NS', '') for symbol in rescanned}
+    merged = [result for result in previous if result['symbol'] not in replaced] + fresh
+    return sorted(merged, key=lambda result: order.get(result['symbol'], len(order)))
+
+async def analyze_all_stocks(symbols=STOCKS_LIST, state_path=freshness.STATE_PATH, analyzers=None, memo_store=None):
+    """Analyze ALL 209 stocks silently (or just the selected `analyzers`; the others come back empty)"""
+    import pipeline
+    print(f"🔍 Analyzing ALL {len(symbols)} stocks...")
+    selected = pipeline.load_analyzers(analyzers)
     
-    smc_results = []
-    bajaj_results = []
-    rsi_results = []
-    engulfing_results = []
+    # Skip analyzers whose timeframes have had no candle close since the last run
+    with TELEMETRY.stage('plan'):
+        state = freshness.load_state(state_path)
+        to_run, to_reuse = freshness.plan({name: pipeline.ANALYZER_INTERVALS[name] for name in selected}, state, symbols)
+        rescan = freshness.pending(state, symbols) if to_reuse else []
+    TELEMETRY.extra['reused'] = to_reuse
+    if to_reuse:
+        print(f"⏭️ No new bars since last run, reusing signals for: {', '.join(to_reuse)}")
     
-    analyzed = 0
-    errors = 0
+    results = {name: [] for name in pipeline.ANALYZER_NAMES}
+    results.update({name: state['results'][name] for name in to_reuse})
+    missing = set()
+    if to_run:
+        # Fetch on an I/O thread, analyze across a process pool, results in universe order
+        with TELEMETRY.stage('scan'):
+            fresh, stats = await pipeline.run(symbols, analyzers=to_run, memo_store=memo_store)
+        results.update({name: fresh[name] for name in to_run})
+        TELEMETRY.extra['pipeline'] = stats
+        report_stats(stats)
+        missing.update(stats['fetch']['missing'])
+    if rescan:
+        # Symbols the last run never analyzed get a scan of the reused analyzers too
+        print(f"🔁 Rescanning {len(rescan)} symbols the last run missed for: {', '.join(to_reuse)}")
+        with TELEMETRY.stage('rescan'):
+            fresh, stats = await pipeline.run(rescan, analyzers=to_reuse, memo_store=memo_store)
+        for name in to_reuse:
+            results[name] = merge_rescanned(results[name], fresh[name], symbols, rescan)
+        TELEMETRY.extra['rescan'] = stats
+        report_stats(stats)
+        missing.update(stats['fetch']['missing'])
     
-    for i, symbol in enumerate(STOCKS_LIST, 1):
-        if i % 20 == 0:
-            print(f"   [{i:3d}/{len(STOCKS_LIST)}] stocks analyzed")
-        
-        try:
-            # Run all analyses
-            smc = analyze_smc_daily(symbol)
-            if smc:
-                smc_results.append(smc)
-            
-            bajaj = analyze_bajaj_hourly(symbol)
-            if bajaj:
-                bajaj_results.append(bajaj)
-            
-            rsi = analyze_rsi_mtf(symbol)
-            if rsi:
-                rsi_results.append(rsi)
-            
-            engulf = analyze_engulfing_4h(symbol)
-            if engulf:
-                engulfing_results.append(engulf)
-            
-            analyzed += 1
-            time.sleep(0.25)  # Rate limiting
-            
-        except Exception as e:
-            errors += 1
-            continue
-    
-    print(f"✅ Analysis complete! Analyzed: {analyzed}, Errors: {errors}")
-    return smc_results, bajaj_results, rsi_results, engulfing_results
-
-async def main():
-    """Main function - ONE MESSAGE ONLY"""
+    # Symbols without a clean result are scanned again next run; the rest is the new baseline
+    missing.update(failure['symbol'] for failure in TELEMETRY.failures)
+    freshness.record_run({name: results[name] for name in to_run + to_reuse}, symbols, path=state_path,
+                         rescan=[symbol for symbol in symbols if symbol in missing])
+    return results['smc'], results['bajaj'], results['rsi'], results['engulfing']
+
+def record_signals(results, symbols, reused=()):
+    """Append this run's signals to the history store (a failure here never stops the message).
+
+    Analyzers in `reused` saw no new bar, so recording their previous
+    signals again would lengthen streaks; they are left out.
+    """
+    results = {name: signals for name, signals in results.items() if name not in reused}
+    if not signal_store.ENABLED or not results:
+        return
+    try:
+        with TELEMETRY.stage('store'):
+            signal_store.record(results, freshness.universe_key(symbols))
+    except Exception as e:
+        print(f"⚠️ Signal store not updated: {e}")
+
+async def run_shard(universe, index, count, directory):
+    """Scan one shard of the universe and write its signals for the merge step (no Telegram)"""
+    symbols = shards.select(universe, index, count)
+    print(f"🧩 Shard {index}/{count}: {len(symbols)} of {len(universe)} stocks")
+    
+    TELEMETRY.reset()
+    tag = f"shard-{index}-of-{count}"
+    results = await analyze_all_stocks(symbols, freshness.tagged_path(tag))
+    path = shards.save(directory, index, count, universe,
+                       dict(zip(['smc', 'bajaj', 'rsi', 'engulfing'], results)))
+    print(f"💾 Shard results written to {path}")
+    TELEMETRY.save(os.path.join(directory, f"report-{tag}.json"), symbols=len(symbols))
+
+async def send_merged(directory):
+    """Combine every shard's signals into ONE message and send it"""
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         print("❌ Telegram credentials missing!")
         return
     
+    merged, total = shards.merge(directory)
+    print(f"🧩 Merged shard results for {total} stocks")
+    message = format_results(merged['smc'], merged['bajaj'], merged['rsi'], merged['engulfing'], total)
+    if await send_telegram_message(message):
+        print("✅ Telegram message sent successfully!")
+    else:
+        print("❌ Failed to send Telegram message")
+
+async def main(symbols=STOCKS_LIST, analyzers=None, dry_run=False, adhoc=False):
+    """Main function - ONE MESSAGE ONLY; returns {analyzer: signals}.
+
+    `adhoc` runs (chosen symbols or analyzers) leave the scheduled run's
+    freshness state and memo untouched; `dry_run` prints the message
+    instead of sending it.
+    """
+    if not dry_run and (not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID):
+        print("❌ Telegram credentials missing!")
+        return
+    
     print("🚀 Starting NSE Stock Analysis...")
-    print(f"📊 Total stocks: {len(STOCKS_LIST)}")
+    print(f"📊 Total stocks: {len(symbols)}")
+    
+    TELEMETRY.reset()
+    started = time.perf_counter()
+    import pipeline
+    import memo
+    pipeline.load_analyzers(analyzers)
+    TELEMETRY.extra['startup_seconds'] = {'imports': round(IMPORT_SECONDS, 3),
+                                          'analyzers': round(time.perf_counter() - started, 3)}
+    state_path = None if adhoc else freshness.STATE_PATH
+    previous = freshness.last_sent(freshness.load_state(state_path), symbols) if SIGNAL_DIFF else None
     
-    # Analyze all stocks
-    results = await analyze_all_stocks()
+    # Analyze all stocks (NSE_PROFILE=cprofile|sample to find hot paths)
+    with telemetry.profiled():
+        results = await analyze_all_stocks(symbols, state_path, analyzers,
+                                           memo.MemoStore(path=None) if adhoc else None)
+    results = dict(zip(pipeline.ANALYZER_NAMES, results))
+    if not adhoc:
+        record_signals(results, symbols, TELEMETRY.extra.get('reused', ()))
     
     # Create ONE comprehensive message
-    message = format_results(*results, len(STOCKS_LIST))
+    with TELEMETRY.stage('format'):
+        message = format_results(results['smc'], results['bajaj'], results['rsi'], results['engulfing'],
+                                 len(symbols), previous=previous)
     
-    # Send ONE message only
-    if await send_telegram_message(message):
-        print("✅ Telegram message sent successfully!")
+    sent = False
+    if dry_run:
+        print(message)
     else:
-        print("❌ Failed to send Telegram message")
+        # Send ONE message only
+        with TELEMETRY.stage('send'):
+            sent = await send_telegram_message(message)
+        if sent:
+            freshness.record_sent(results, symbols, state_path)
+            print("✅ Telegram message sent successfully!")
+        else:
+            print("❌ Failed to send Telegram message")
+    
+    TELEMETRY.save(symbols=len(symbols), signals={name: len(r) for name, r in results.items()},
+                   telegram_sent=sent)
+    return results
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description='NSE stock scanner')
+    parser.add_argument('--analyzers', help="comma-separated analyzers to run: smc, bajaj, rsi, engulfing (default: all)")
+    parser.add_argument('--symbols', help='comma-separated NSE symbols to scan instead of the universe, e.g. RELIANCE,TCS')
+    parser.add_argument('--dry-run', action='store_true', help='print the message instead of sending it to Telegram')
+    parser.add_argument('--output', choices=['text', 'json'], default='text',
+                        help='json: print the signals as JSON on stdout, with the log on stderr')
+    parser.add_argument('--daemon', action='store_true',
+                        help='stay resident and scan after every NSE candle close')
+    parser.add_argument('--universe', help='CSV/xlsx of symbols to scan instead of the F&O list')
+    parser.add_argument('--shard', help='scan only shard i/N and write its results to --shard-dir')
+    parser.add_argument('--shard-dir', default='shards', help='where shard results are written and merged from')
+    parser.add_argument('--merge', action='store_true', help='merge --shard-dir results into one Telegram message')
+    args = parser.parse_args()
+    
+    analyzers = args.analyzers.split(',') if args.analyzers else None
+    if analyzers:
+        import pipeline
+        unknown = [name for name in analyzers if name not in pipeline.ANALYZER_NAMES]
+        if unknown:
+            parser.error(f"unknown analyzer(s) {', '.join(unknown)}; choose from {', '.join(pipeline.ANALYZER_NAMES)}")
+    
+    if args.merge:
+        asyncio.run(send_merged(args.shard_dir))
+    elif args.shard:
+        asyncio.run(run_shard(get_universe(args.universe), *shards.parse_shard(args.shard), args.shard_dir))
+    elif args.daemon:
+        if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+            print("❌ Telegram credentials missing!")
+        else:
+            import daemon
+            daemon.run_forever(get_universe(args.universe), format_results, send_telegram_message, SIGNAL_DIFF)
+    else:
+        symbols = [to_yahoo(s) for s in args.symbols.split(',')] if args.symbols else get_universe(args.universe)
+        adhoc = bool(args.symbols or args.analyzers)
+        if args.output == 'json':
+            if not args.dry_run and (not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID):
+                print("❌ Telegram credentials missing! Pass --dry-run to only print the signals", file=sys.stderr)
+                sys.exit(1)
+            with redirect_stdout(sys.stderr):
+                results = asyncio.run(main(symbols, analyzers, args.dry_run, adhoc))
+            print(json.dumps({'symbols': len(symbols), 'analyzers': analyzers or list(results),
+                              'signals': results, 'startup_seconds': TELEMETRY.extra.get('startup_seconds')},
+                             indent=2, default=str))
+        else:
+            asyncio.run(main(symbols, analyzers, args.dry_run, adhoc))
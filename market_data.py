@@ -0,0 +1,589 @@
+import os
+import time
+import random
+import threading
+import pandas as pd
+import ohlcv_cache
+import resample
+from telemetry import TELEMETRY, classify_message, classify_exception
+import warnings
+warnings.filterwarnings('ignore')
+
+# Widest lookback per interval, as declared by the analysis modules
+REQUIREMENTS = {}
+
+# Intervals built locally from session-aligned hourly bars instead of downloaded:
+# {interval: (source interval, bucket hours or None for one bar per session)}
+DERIVED = {}
+if os.getenv('NSE_RESAMPLE_4H', '1') == '1':
+    DERIVED['4h'] = ('1h', 4)
+if os.getenv('NSE_RESAMPLE_1D', '0') == '1':
+    DERIVED['1d'] = ('1h', None)
+
+# Tickers per multi-ticker Yahoo request
+BATCH_SIZE = int(os.getenv('NSE_BATCH_SIZE', '50'))
+
+# HTTP requests yfinance may have in flight, and the global request rate across all of them
+# (both are starting points: they adapt to how Yahoo responds, see RateLimiter)
+MAX_IN_FLIGHT = int(os.getenv('NSE_MAX_IN_FLIGHT', '8'))
+REQUESTS_PER_SECOND = float(os.getenv('NSE_REQUESTS_PER_SECOND', '10'))
+
+# AIMD bounds: clean responses raise the rate by RATE_STEP and in-flight requests by one,
+# up to these ceilings; throttled ones halve both, down to the floors
+MAX_REQUESTS_PER_SECOND = float(os.getenv('NSE_MAX_REQUESTS_PER_SECOND', str(REQUESTS_PER_SECOND * 4)))
+MIN_REQUESTS_PER_SECOND = float(os.getenv('NSE_MIN_REQUESTS_PER_SECOND', str(REQUESTS_PER_SECOND / 4)))
+MAX_IN_FLIGHT_CEILING = int(os.getenv('NSE_MAX_IN_FLIGHT_CEILING', str(MAX_IN_FLIGHT * 2)))
+RATE_STEP = float(os.getenv('NSE_RATE_STEP', '1'))
+
+# Failure kinds that mean Yahoo is pushing back rather than a ticker having no data
+THROTTLE_KINDS = ('rate_limited', 'timeout')
+
+# A multi-ticker response is throttled if more than this share of its tickers came back empty
+EMPTY_THROTTLE_SHARE = 0.5
+
+# Retries per failed (symbol, interval) fetch, and the base of their jittered exponential backoff (s)
+FETCH_RETRIES = int(os.getenv('NSE_FETCH_RETRIES', '2'))
+RETRY_BACKOFF = float(os.getenv('NSE_RETRY_BACKOFF', '2'))
+
+# Throttled responses in a row that stop all fetching, and for how long (s)
+BREAKER_THRESHOLD = int(os.getenv('NSE_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.getenv('NSE_BREAKER_COOLDOWN', '60'))
+
+# Breaker cooldowns a fetch may wait out before it counts as missing
+MAX_DEFERRALS = int(os.getenv('NSE_MAX_DEFERRALS', '3'))
+
+class RateLimiter:
+    """Thread-safe limiter that spaces requests evenly at `rate` per second.
+
+    Given a `ceiling` above `rate` it adapts (AIMD): every clean response
+    adds RATE_STEP requests/second and one in-flight request, every
+    throttled one halves both, so the rate settles just under what Yahoo
+    tolerates instead of a fixed guess.
+    """
+
+    def __init__(self, rate, ceiling=None, floor=None, in_flight=MAX_IN_FLIGHT, max_in_flight=None):
+        self.rate = rate
+        self.ceiling = max(rate, ceiling) if ceiling is not None else rate
+        self.floor = min(rate, floor) if floor is not None else rate
+        self.in_flight = in_flight
+        self.max_in_flight = max(in_flight, max_in_flight or in_flight)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        """Block until `n` more requests fit within the rate"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+    def succeeded(self):
+        """Additive increase after a clean response"""
+        with self._lock:
+            self.rate = min(self.ceiling, self.rate + RATE_STEP)
+            self.in_flight = min(self.max_in_flight, self.in_flight + 1)
+
+    def throttled(self):
+        """Multiplicative decrease after a 429, a timeout or a mostly empty response"""
+        with self._lock:
+            self.rate = max(self.floor, self.rate / 2)
+            self.in_flight = max(1, self.in_flight // 2)
+
+    def snapshot(self):
+        return {'rate': round(self.rate, 2), 'in_flight': self.in_flight}
+
+LIMITER = RateLimiter(REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND,
+                      MAX_IN_FLIGHT, MAX_IN_FLIGHT_CEILING)
+
+class CircuitOpen(Exception):
+    """Raised instead of requesting while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Stops all fetching after `threshold` throttled responses in a row.
+
+    Once `cooldown` seconds pass, one trial request goes through: a clean
+    response closes the breaker, another throttled one reopens it.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.strikes = 0
+        self.opened = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpen while open"""
+        with self._lock:
+            if self.opened is None:
+                return
+            left = self.cooldown - (time.monotonic() - self.opened)
+            if left > 0:
+                raise CircuitOpen(f"Yahoo is throttling, fetching paused for {left:.0f}s")
+            self.opened = None
+            self.strikes = self.threshold - 1  # Half-open: one more strike reopens it
+
+    def record(self, throttled):
+        with self._lock:
+            if not throttled:
+                self.strikes = 0
+                return
+            self.strikes += 1
+            if self.strikes >= self.threshold and self.opened is None:
+                self.opened = time.monotonic()
+                self.trips += 1
+                print(f"🔌 Yahoo keeps throttling, pausing fetches for {self.cooldown:.0f}s")
+
+    def reopens_at(self):
+        """monotonic() time the breaker lets a trial through (None if closed)"""
+        return self.opened + self.cooldown if self.opened is not None else None
+
+BREAKER = CircuitBreaker()
+
+class RetryQueue:
+    """Failed (symbol, interval) fetches waiting for another try.
+
+    Each failure schedules the next try RETRY_BACKOFF * 2**attempt seconds
+    out, jittered by ±50% so retries don't arrive in lockstep; after
+    `retries` tries, or `max_deferrals` skips while the breaker is open,
+    the key counts as missing.
+    """
+
+    def __init__(self, retries=FETCH_RETRIES, backoff=RETRY_BACKOFF, max_deferrals=MAX_DEFERRALS):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_deferrals = max_deferrals
+        self.reset()
+
+    def reset(self):
+        self.attempts = {}
+        self.deferrals = {}
+        self.due = {}
+        self.missing = set()
+        self.recovered = set()
+
+    def failed(self, symbol, interval):
+        key = (symbol, interval)
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        if self.attempts[key] > self.retries:
+            self.due.pop(key, None)
+            self.missing.add(key)
+            return
+        delay = self.backoff * 2 ** (self.attempts[key] - 1) * random.uniform(0.5, 1.5)
+        self.due[key] = time.monotonic() + delay
+
+    def defer(self, symbol, interval, until):
+        """Reschedule a fetch the circuit breaker skipped, without using up a try"""
+        key = (symbol, interval)
+        self.attempts.setdefault(key, 0)
+        self.deferrals[key] = self.deferrals.get(key, 0) + 1
+        if self.deferrals[key] > self.max_deferrals:
+            # Yahoo kept throttling through every cooldown: stop waiting on this key
+            self.due.pop(key, None)
+            self.missing.add(key)
+            return
+        self.due[key] = until + random.uniform(0, self.backoff)
+
+    def succeeded(self, symbol, interval):
+        key = (symbol, interval)
+        if key in self.due:
+            del self.due[key]
+            self.recovered.add(key)
+            TELEMETRY.drop_failures(symbol, interval)
+
+    def waiting(self, symbol):
+        """True if a fetch for `symbol` is queued for retry"""
+        return any(key[0] == symbol for key in self.due)
+
+    def next_due(self):
+        return min(self.due.values()) if self.due else None
+
+    def ready(self, now=None):
+        """{interval: [symbols]} whose retry is due"""
+        now = time.monotonic() if now is None else now
+        ready = {}
+        for (symbol, interval), due in self.due.items():
+            if due <= now:
+                ready.setdefault(interval, []).append(symbol)
+        return ready
+
+    def report(self):
+        return {
+            'retried': len(self.attempts),
+            'recovered': len(self.recovered),
+            'missing': sorted({symbol for symbol, _ in self.missing}),
+        }
+
+RETRY = RetryQueue()
+
+# Symbols downloaded, and (symbol, interval) loads skipped because an analyzer short-circuited
+STATS = {'downloads': 0, 'fetches_avoided': 0}
+
+# yf.download keeps per-call results in module globals, so calls must not overlap;
+# concurrency comes from its own per-ticker threads (MAX_IN_FLIGHT)
+_YF_LOCK = threading.Lock()
+
+def period_to_offset(period):
+    """Convert a Yahoo period string ('60d', '2mo', '1y') to a pandas offset"""
+    if period.endswith('mo'):
+        return pd.DateOffset(months=int(period[:-2]))
+    if period.endswith('y'):
+        return pd.DateOffset(years=int(period[:-1]))
+    if period.endswith('wk'):
+        return pd.DateOffset(weeks=int(period[:-2]))
+    if period.endswith('d'):
+        return pd.DateOffset(days=int(period[:-1]))
+    raise ValueError(f"Unsupported period: {period}")
+
+def period_start(period, now=None):
+    """Timestamp at which a lookback of `period` ending at `now` begins"""
+    now = now if now is not None else pd.Timestamp.now(tz='UTC')
+    return now - period_to_offset(period)
+
+def wider_period(a, b):
+    """Return whichever of two periods reaches further back"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if period_start(a) <= period_start(b) else b
+
+def register(requirements):
+    """Declare the {interval: period} lookbacks an analyzer needs"""
+    for interval, period in requirements.items():
+        REQUIREMENTS[interval] = wider_period(REQUIREMENTS.get(interval), period)
+
+def fetch_plan():
+    """{interval: period} actually downloaded, with derived intervals folded into their source"""
+    plan = {}
+    for interval, period in REQUIREMENTS.items():
+        source = DERIVED[interval][0] if interval in DERIVED else interval
+        plan[source] = wider_period(plan.get(source), period)
+    return plan
+
+def normalize_frame(frame, symbol):
+    """Flatten yfinance's (Price, Ticker) columns for a single symbol"""
+    if isinstance(frame.columns, pd.MultiIndex):
+        if symbol in frame.columns.get_level_values(-1):
+            frame = frame.xs(symbol, axis=1, level=-1)
+        else:
+            frame = frame.droplevel(-1, axis=1)
+    return frame
+
+def range_kwargs(period, start):
+    """yf.download keyword for either a lookback period or an explicit start"""
+    return {'start': start} if start is not None else {'period': period}
+
+def record_download(symbols, interval, started, throttled, frame):
+    """Feed one Yahoo request's latency, size and per-ticker errors to telemetry; returns {symbol: failure kind}"""
+    TELEMETRY.record_fetch(interval, time.perf_counter() - started, len(symbols),
+                           frame.memory_usage(index=True).sum(), throttled)
+    errors = getattr(getattr(yfinance(), 'shared', None), '_ERRORS', None) or {}
+    kinds = {}
+    for symbol in symbols:
+        message = errors.get(symbol.upper())
+        if message:
+            kinds[symbol] = classify_message(message)
+            TELEMETRY.record_failure(symbol, interval, kinds[symbol], message)
+    return kinds
+
+def record_response(throttled):
+    """Adapt the request rate and feed the circuit breaker after one Yahoo response"""
+    if throttled:
+        LIMITER.throttled()
+    else:
+        LIMITER.succeeded()
+    BREAKER.record(throttled)
+
+def is_throttled(kinds, frames):
+    """True if a response shows Yahoo pushing back: a 429 or timeout, or mostly empty frames.
+
+    A lone empty frame is more likely a delisted ticker than throttling,
+    so emptiness only counts across a multi-ticker response.
+    """
+    if any(kind in THROTTLE_KINDS for kind in kinds.values()):
+        return True
+    empty = sum(1 for frame in frames if frame.empty)
+    return len(frames) > 1 and empty > len(frames) * EMPTY_THROTTLE_SHARE
+
+def yfinance():
+    """The yfinance module, imported on the first download (it costs ~0.25s of startup)"""
+    import yfinance as yf
+    return yf
+
+def download(symbol, period, interval, start=None):
+    """Download one symbol/interval from Yahoo Finance"""
+    BREAKER.check()
+    waited = time.perf_counter()
+    LIMITER.acquire()
+    STATS['downloads'] += 1
+    with _YF_LOCK:
+        started = time.perf_counter()
+        try:
+            frame = yfinance().download(symbol, interval=interval, progress=False, **range_kwargs(period, start))
+        except Exception as e:
+            kind = classify_exception(e)
+            TELEMETRY.record_failure(symbol, interval, kind, repr(e))
+            record_response(kind in THROTTLE_KINDS)
+            raise
+        kinds = record_download([symbol], interval, started, started - waited, frame)
+    frame = normalize_frame(frame, symbol)
+    record_response(is_throttled(kinds, [frame]))
+    return frame
+
+def split_batch(frame, symbols):
+    """Split a multi-ticker download into one frame per symbol"""
+    frames = {}
+    tickers = set(frame.columns.get_level_values(0)) if isinstance(frame.columns, pd.MultiIndex) else set()
+    for symbol in symbols:
+        if symbol in tickers:
+            frames[symbol] = frame[symbol].dropna(how='all')
+        elif len(symbols) == 1:
+            frames[symbol] = normalize_frame(frame, symbol).dropna(how='all')
+        else:
+            frames[symbol] = pd.DataFrame()
+    return frames
+
+def download_batch(symbols, period, interval, start=None):
+    """Download many symbols for one interval in a single Yahoo request"""
+    BREAKER.check()
+    waited = time.perf_counter()
+    LIMITER.acquire(len(symbols))
+    STATS['downloads'] += len(symbols)
+    with _YF_LOCK:
+        started = time.perf_counter()
+        try:
+            frame = yfinance().download(list(symbols), interval=interval, group_by='ticker', progress=False,
+                                       threads=LIMITER.in_flight, **range_kwargs(period, start))
+        except Exception as e:
+            kind = classify_exception(e)
+            for symbol in symbols:
+                TELEMETRY.record_failure(symbol, interval, kind, repr(e))
+            record_response(kind in THROTTLE_KINDS)
+            raise
+        kinds = record_download(symbols, interval, started, started - waited, frame)
+    frames = split_batch(frame, symbols)
+    record_response(is_throttled(kinds, list(frames.values())))
+    return frames
+
+def download_many(symbols, period, interval, start=None):
+    """Per-symbol frames for any number of symbols, using one request"""
+    if len(symbols) == 1:
+        return {symbols[0]: download(symbols[0], period, interval, start).dropna(how='all')}
+    return download_batch(symbols, period, interval, start)
+
+def fetch(symbols, period, interval):
+    """Per-symbol frames covering `period`, topped up incrementally from the on-disk cache"""
+    symbols = list(symbols)
+    if not ohlcv_cache.ENABLED:
+        TELEMETRY.record_cache(interval, 'miss', len(symbols))
+        return download_many(symbols, period, interval)
+
+    cutoff = period_start(period)
+    cached = {s: ohlcv_cache.load(s, interval) for s in symbols}
+    stale = [s for s in symbols if cached[s] is not None and ohlcv_cache.covers(cached[s], cutoff)]
+    missing = [s for s in symbols if s not in stale]
+    TELEMETRY.record_cache(interval, 'miss', len(missing))
+
+    frames = {}
+    if stale:
+        # Only bars from the revised tail onwards, one request for the whole group
+        start = min(ohlcv_cache.delta_start(cached[s]) for s in stale)
+        deltas = download_many(stale, period, interval, start=start)
+        for symbol in stale:
+            merged = ohlcv_cache.merge(cached[symbol], deltas.get(symbol, pd.DataFrame()))
+            if merged is None:
+                missing.append(symbol)
+                TELEMETRY.record_cache(interval, 'revised')
+            else:
+                frames[symbol] = merged
+                TELEMETRY.record_cache(interval, 'hit')
+    if missing:
+        frames.update(download_many(missing, period, interval))
+
+    for symbol, frame in frames.items():
+        if not frame.empty:
+            full, frame = frame, slice_period(frame, period)
+            frames[symbol] = frame
+            # A shorter (ad-hoc) lookback must not shrink the bars a longer run cached
+            stored = cached.get(symbol)
+            if stored is None or not ohlcv_cache.narrows(stored, frame):
+                ohlcv_cache.save(symbol, interval, frame)
+            elif not ohlcv_cache.narrows(stored, full):
+                ohlcv_cache.save(symbol, interval, full)
+    return frames
+
+def chunks(symbols, size):
+    """Split a symbol list into consecutive chunks of at most `size`"""
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+def slice_period(frame, period):
+    """Zero-copy tail of `frame` covering the last `period`"""
+    if frame.empty:
+        return frame
+    cutoff = period_start(period, pd.Timestamp.now(tz=frame.index.tz))
+    start = frame.index.searchsorted(cutoff)
+    return frame.iloc[start:]
+
+def same_tail(old, new, bars=ohlcv_cache.REVISE_BARS):
+    """True if the newest bars of two frames are identical"""
+    if old.empty or new.empty or old.index[-1] != new.index[-1]:
+        return False
+    columns = [c for c in ohlcv_cache.COLUMNS if c in old.columns and c in new.columns]
+    return old[columns].iloc[-bars:].equals(new[columns].iloc[-bars:])
+
+class MarketData:
+    """Per-run store that fetches each (symbol, interval) once at its widest lookback.
+
+    A resident store (the daemon's) keeps frames across scans and brings
+    them up to date with refresh() instead of refetching them.
+    """
+
+    def __init__(self, resident=False):
+        self._frames = {}
+        self.resident = resident
+
+    def get(self, symbol, interval, period):
+        return slice_period(self._entry(symbol, interval, period)[0], period)
+
+    def _entry(self, symbol, interval, period):
+        """(frame, period it covers) for a key, fetching or resampling on a miss"""
+        key = (symbol, interval)
+        entry = self._frames.get(key)
+        if entry is not None and wider_period(entry[1], period) == entry[1]:
+            return entry
+        if interval in DERIVED:
+            source, hours = DERIVED[interval]
+            base, base_period = self._entry(symbol, source, period)
+            entry = (resample.resample_sessions(base, hours), base_period)
+        else:
+            fetch_period = wider_period(fetch_plan().get(interval), period)
+            entry = (fetch([symbol], fetch_period, interval)[symbol], fetch_period)
+        self._frames[key] = entry
+        return entry
+
+    def prefetch(self, symbols, intervals=None, batch_size=None):
+        """Fill the store for `symbols` with one request per chunk and interval.
+
+        Keys that fail (empty, or the request raised) go on the RETRY queue
+        instead of falling back to per-symbol downloads.
+        """
+        plan = fetch_plan()
+        for interval in intervals or list(plan):
+            period = plan[interval]
+            for chunk in chunks(list(symbols), batch_size or BATCH_SIZE):
+                try:
+                    frames = fetch(chunk, period, interval)
+                except CircuitOpen:
+                    for symbol in chunk:
+                        RETRY.defer(symbol, interval, BREAKER.reopens_at() or time.monotonic())
+                    continue
+                except Exception as e:
+                    print(f"⚠️ {interval} download of {len(chunk)} symbols failed, queued for retry: {e}")
+                    frames = {}
+                for symbol in chunk:
+                    frame = frames.get(symbol)
+                    if frame is None or frame.empty:
+                        RETRY.failed(symbol, interval)
+                    else:
+                        RETRY.succeeded(symbol, interval)
+                    self._frames[(symbol, interval)] = (frame if frame is not None else pd.DataFrame(), period)
+
+    def refresh(self, symbols, intervals=None, batch_size=None):
+        """Top up held frames with one delta request per chunk; returns the symbols whose bars changed.
+
+        Keys not held yet (or held empty) are fetched in full. Derived
+        intervals built from a changed source are dropped and rebuilt on use.
+        A chunk that fails goes on the RETRY queue, like in prefetch(), and
+        its symbols keep their held bars until a retry refreshes them.
+        """
+        plan = fetch_plan()
+        changed = set()
+        for interval in intervals or list(plan):
+            period = plan[interval]
+            for chunk in chunks(list(symbols), batch_size or BATCH_SIZE):
+                held = {s: self._frames[(s, interval)][0] for s in chunk
+                        if (s, interval) in self._frames and not self._frames[(s, interval)][0].empty}
+                cold = [s for s in chunk if s not in held]
+                try:
+                    frames = self._refresh_chunk(held, cold, period, interval)
+                except CircuitOpen:
+                    for symbol in chunk:
+                        RETRY.defer(symbol, interval, BREAKER.reopens_at() or time.monotonic())
+                    continue
+                except Exception as e:
+                    print(f"⚠️ {interval} refresh of {len(chunk)} symbols failed, queued for retry: {e}")
+                    for symbol in chunk:
+                        RETRY.failed(symbol, interval)
+                    continue
+                for symbol in chunk:
+                    if symbol in held or not frames.get(symbol, pd.DataFrame()).empty:
+                        RETRY.succeeded(symbol, interval)
+                    else:
+                        RETRY.failed(symbol, interval)
+
+                for symbol, frame in frames.items():
+                    old = held.get(symbol)
+                    if old is not None and same_tail(old, frame):
+                        continue
+                    changed.add(symbol)
+                    self._frames[(symbol, interval)] = (frame, period)
+                    if old is not None and ohlcv_cache.ENABLED and not frame.empty:
+                        ohlcv_cache.save(symbol, interval, frame)
+                    for derived, (source, _) in DERIVED.items():
+                        if source == interval:
+                            self._frames.pop((symbol, derived), None)
+        return changed
+
+    def _refresh_chunk(self, held, cold, period, interval):
+        """New frames for one chunk: cold symbols in full, held ones topped up with a delta"""
+        frames = fetch(cold, period, interval) if cold else {}
+        if held:
+            start = min(ohlcv_cache.delta_start(frame) for frame in held.values())
+            deltas = download_many(list(held), period, interval, start=start)
+            revised = []
+            for symbol, frame in held.items():
+                merged = ohlcv_cache.merge(frame, deltas.get(symbol, pd.DataFrame()))
+                if merged is None:
+                    revised.append(symbol)
+                else:
+                    frames[symbol] = slice_period(merged, period)
+            if revised:
+                frames.update(fetch(revised, period, interval))
+        return frames
+
+    def peek(self, symbol, interval):
+        """Held frame for a key without fetching (None if not loaded)"""
+        entry = self._frames.get((symbol, interval))
+        return entry[0] if entry is not None else None
+
+    def has(self, symbol, interval):
+        """True if bars for this key are already held (derived intervals count their source)"""
+        if interval in DERIVED and (symbol, interval) not in self._frames:
+            interval = DERIVED[interval][0]
+        return (symbol, interval) in self._frames
+
+    def evict(self, symbol):
+        for key in [k for k in self._frames if k[0] == symbol]:
+            del self._frames[key]
+
+    def release(self, symbol):
+        """Drop a symbol's bars once analyzed, unless the store is resident"""
+        if not self.resident:
+            self.evict(symbol)
+
+    def clear(self):
+        self._frames.clear()
+
+STORE = MarketData()
+
+def record_avoided(symbol, intervals):
+    """Count loads an analyzer skipped that would have needed a download"""
+    STATS['fetches_avoided'] += sum(1 for interval in intervals if not STORE.has(symbol, interval))
+
+def get_frame(symbol, interval, period):
+    """Bars for `symbol` at `interval` covering `period`, from the shared store"""
+    return STORE.get(symbol, interval, period)
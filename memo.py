@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+import numpy as np
+import ohlcv_cache
+from ohlcv import OHLCV
+
+# Memoized analyzer results live next to the bar cache
+MEMO_PATH = os.path.join(ohlcv_cache.CACHE_DIR, 'memo.json') if ohlcv_cache.ENABLED else None
+
+# Set NSE_MEMO=0 to always recompute
+ENABLED = os.getenv('NSE_MEMO', '1') == '1'
+
+def bars_hash(data):
+    """Digest of an analyzer input: OHLCV bars, or a dict of them (RSI's timeframes)"""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, dict):
+        for key in sorted(data):
+            digest.update(key.encode())
+            digest.update(bars_hash(data[key]).encode())
+        return digest.hexdigest()
+    digest.update(np.ascontiguousarray(data.timestamps).view(np.int64).tobytes())
+    for field in OHLCV.FIELDS:
+        digest.update(np.ascontiguousarray(data[field], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def code_hash(*modules, params=None):
+    """Digest of the analyzer's source and parameters, so edited thresholds or logic miss the memo"""
+    digest = hashlib.blake2b(digest_size=8)
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+class MemoStore:
+    """Analyzer results keyed by (analyzer, symbol, input-bar digest, code/parameter digest).
+
+    Only entries used or written this run are saved, so the file holds
+    one generation of results and never grows with history.
+    """
+
+    def __init__(self, path=MEMO_PATH):
+        self.path = path
+        self.entries = {}
+        self.touched = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except Exception:
+                self.entries = {}
+
+    def key(self, name, symbol, data, version):
+        return f"{name}|{symbol}|{bars_hash(data)}|{version}"
+
+    def get(self, key):
+        """(True, result) on a hit, (False, None) on a miss"""
+        if key in self.entries:
+            self.stats['hits'] += 1
+            self.touched[key] = self.entries[key]
+            return True, self.entries[key]
+        self.stats['misses'] += 1
+        return False, None
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.touched[key] = result
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.touched, f)
+        os.replace(tmp, self.path)
+        self.entries, self.touched = dict(self.touched), {}
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+class OHLCV:
+    """Structure-of-arrays bar container backed by NumPy float64 arrays.
+
+    Indexing by field name (data['close']) keeps the old dict-of-lists call
+    sites working; tail() and window() return views that share memory with
+    the parent instead of copying.
+    """
+
+    __slots__ = ('timestamps', 'open', 'high', 'low', 'close', 'volume', 'tz')
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, timestamps, open, high, low, close, volume=None, tz=None):
+        self.timestamps = timestamps
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume if volume is not None else np.zeros(len(close))
+        self.tz = tz
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build from a yfinance-style frame (Open/High/Low/Close[/Volume] columns)"""
+        index = frame.index
+        tz = str(index.tz) if index.tz is not None else None
+        if tz:
+            index = index.tz_convert('UTC').tz_localize(None)
+
+        def column(name):
+            return frame[name].to_numpy(dtype=np.float64)
+
+        volume = column('Volume') if 'Volume' in frame.columns else None
+        return cls(index.to_numpy(dtype='datetime64[ns]'), column('Open'), column('High'),
+                   column('Low'), column('Close'), volume, tz)
+
+    @classmethod
+    def from_arrays(cls, timestamps, open, high, low, close, volume=None, tz=None):
+        """Build from any array-likes, converting to float64 where needed"""
+        def as_array(values):
+            return np.asarray(values, dtype=np.float64) if values is not None else None
+
+        return cls(np.asarray(timestamps, dtype='datetime64[ns]'), as_array(open), as_array(high),
+                   as_array(low), as_array(close), as_array(volume), tz)
+
+    def __len__(self):
+        return len(self.close)
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def __repr__(self):
+        span = f"{self.timestamps[0]} .. {self.timestamps[-1]}" if len(self) else "empty"
+        return f"OHLCV({len(self)} bars, {span})"
+
+    def window(self, start, stop=None):
+        """Zero-copy view of bars [start:stop]"""
+        bars = slice(start, stop)
+        return OHLCV(self.timestamps[bars], self.open[bars], self.high[bars], self.low[bars],
+                     self.close[bars], self.volume[bars], self.tz)
+
+    def tail(self, n):
+        """Zero-copy view of the last `n` bars"""
+        return self.window(max(len(self) - n, 0))
+
+    def since(self, timestamp):
+        """Zero-copy view of bars at or after `timestamp`"""
+        ts = pd.Timestamp(timestamp)
+        if ts.tzinfo is not None:
+            ts = ts.tz_convert('UTC').tz_localize(None)
+        return self.window(int(np.searchsorted(self.timestamps, ts.to_datetime64())))
+
+    def index(self):
+        """Timestamps as a pandas DatetimeIndex in the original timezone"""
+        index = pd.DatetimeIndex(self.timestamps)
+        return index.tz_localize('UTC').tz_convert(self.tz) if self.tz else index
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in self.FIELDS) + self.timestamps.nbytes
@@ -0,0 +1,95 @@
+import os
+from datetime import timedelta
+import numpy as np
+
+# On-disk bar cache, one .npz per (symbol, interval); set NSE_CACHE_DIR="" to disable
+CACHE_DIR = os.getenv('NSE_CACHE_DIR', '.ohlcv_cache')
+ENABLED = bool(CACHE_DIR)
+
+# Trailing bars re-fetched every run so candles that were still forming get their final values
+REVISE_BARS = 3
+
+# Slack allowed between the requested lookback start and the first cached bar (weekends, holidays)
+COVERAGE_SLACK = timedelta(days=7)
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def cache_path(symbol, interval):
+    """Path of the cache file for one symbol/interval"""
+    safe = symbol.replace('/', '_').replace('&', '_and_')
+    return os.path.join(CACHE_DIR, interval, f"{safe}.npz")
+
+def load(symbol, interval):
+    """Load cached bars, or None when missing or unreadable"""
+    import pandas as pd  # Only runs that fetch need pandas
+    try:
+        with np.load(cache_path(symbol, interval)) as npz:
+            index = pd.DatetimeIndex(npz['ts'])
+            tz = str(npz['tz'])
+            if tz:
+                index = index.tz_localize('UTC').tz_convert(tz)
+            frame = pd.DataFrame({col: npz[col.lower()] for col in COLUMNS}, index=index)
+        return frame if check_integrity(frame) else None
+    except Exception:
+        return None
+
+def save(symbol, interval, frame):
+    """Atomically write bars to the cache"""
+    path = cache_path(symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tz = str(frame.index.tz) if frame.index.tz is not None else ''
+    index = frame.index.tz_convert('UTC') if tz else frame.index
+    arrays = {col.lower(): frame[col].to_numpy(dtype=np.float64) for col in COLUMNS}
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, ts=index.asi8, tz=np.array(tz), **arrays)
+    os.replace(tmp, path)
+
+def check_integrity(frame):
+    """Timestamps strictly increasing and OHLC finite and consistent"""
+    if frame.empty:
+        return False
+    if not frame.index.is_monotonic_increasing or not frame.index.is_unique:
+        return False
+    prices = frame[['Open', 'High', 'Low', 'Close']].to_numpy()
+    if not np.isfinite(prices).all():
+        return False
+    return bool((frame['High'].to_numpy() >= frame['Low'].to_numpy()).all())
+
+def covers(frame, cutoff):
+    """True if cached bars reach back to the lookback start"""
+    if frame.index.tz is None and cutoff.tzinfo is not None:
+        cutoff = cutoff.tz_localize(None)
+    return frame.index[0] <= cutoff + COVERAGE_SLACK
+
+def narrows(cached, frame):
+    """True if writing `frame` would drop bars from the start of the cached span"""
+    return frame.index[0] > cached.index[0] + COVERAGE_SLACK
+
+def delta_start(frame):
+    """First timestamp to re-request from Yahoo"""
+    return frame.index[-min(REVISE_BARS, len(frame))]
+
+def merge(cached, delta):
+    """Append freshly downloaded bars to cached ones, replacing the revised tail.
+
+    Returns None when the overlap disagrees with the cache (e.g. a split or
+    dividend re-adjusted history) so the caller can fall back to a full fetch.
+    """
+    if delta.empty:
+        return cached
+    delta = delta.dropna(subset=['Open', 'High', 'Low', 'Close'])
+    if delta.empty:
+        return cached
+
+    # The oldest re-fetched bar was final last run, so it must not have changed
+    anchor = cached.index[-min(REVISE_BARS, len(cached))]
+    if anchor in delta.index and anchor != cached.index[-1]:
+        old_close = cached.at[anchor, 'Close']
+        new_close = delta.at[anchor, 'Close']
+        if not np.isclose(old_close, new_close, rtol=1e-6, atol=0.0):
+            return None
+
+    import pandas as pd
+    merged = pd.concat([cached[cached.index < delta.index[0]], delta[COLUMNS]])
+    return merged if check_integrity(merged) else None
@@ -0,0 +1,455 @@
+import os
+import time
+import asyncio
+import importlib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import market_data
+import rsi_state
+import memo
+import shm_arena
+import screens
+import indicators
+import rsi_engine
+from telemetry import TELEMETRY, classify_exception, classify_frames
+
+# Analysis processes (0 = run analyzers inline on the event loop)
+ANALYSIS_WORKERS = int(os.getenv('NSE_ANALYSIS_WORKERS', str(os.cpu_count() or 1)))
+
+# Bundles buffered between the fetch and analysis stages before fetching pauses
+QUEUE_SIZE = int(os.getenv('NSE_QUEUE_SIZE', '64'))
+
+# name -> (module, loader, evaluator, universe-wide scan or None, batch gate or None,
+# loader keyword arguments); a module is only imported once its analyzer is selected,
+# see load_analyzers()
+REGISTRY = {
+    'smc': ('analysis_smc_1d', 'get_stock_data', 'evaluate_smc_daily', None, 'screen_smc_daily', {}),
+    'bajaj': ('analysis_bajaj_hourly', 'get_hourly_data', 'evaluate_bajaj_hourly', None, 'screen_bajaj_hourly', {}),
+    'rsi': ('analysis_rsi_mtf', 'get_multi_timeframe_data', 'evaluate_rsi_mtf', 'scan_rsi_mtf', None, {'lazy': True}),
+    'engulfing': ('analysis_engulfing_4h', 'get_4h_data', 'evaluate_engulfing_4h', 'scan_engulfing_4h', None, {}),
+}
+
+ANALYZER_NAMES = list(REGISTRY)
+
+# The tables below hold only the analyzers loaded so far, in ANALYZER_NAMES order
+
+# (name, loader run on the I/O thread, evaluator run in a worker process)
+ANALYZERS = []
+
+ANALYZER_MODULES = {}
+
+# Bar intervals each analyzer reads
+ANALYZER_INTERVALS = {}
+
+# Digest of each analyzer's code, part of its memo key
+ANALYZER_VERSIONS = {}
+
+# Analyzers evaluated once across the whole universe in the main process
+UNIVERSE_ANALYZERS = {}
+
+# Vectorized pre-screens applied to each fetched batch before its inputs reach the workers
+BATCH_GATES = {}
+
+def load_analyzers(names=None):
+    """Import the selected analyzers' modules (default: all) into the tables above; returns the names.
+
+    Importing a module registers its DATA_REQUIREMENTS, so a run that
+    loads only some analyzers fetches only their intervals and lookbacks.
+    """
+    names = ANALYZER_NAMES if names is None else list(names)
+    for name in names:
+        if name in ANALYZER_MODULES:
+            continue
+        if name not in REGISTRY:
+            raise ValueError(f"Unknown analyzer '{name}' (choose from {', '.join(ANALYZER_NAMES)})")
+        module_name, loader, evaluate, scan, gate, kwargs = REGISTRY[name]
+        module = importlib.import_module(module_name)
+        loader = getattr(module, loader)
+        ANALYZERS.append((name, partial(loader, **kwargs) if kwargs else loader, getattr(module, evaluate)))
+        ANALYZER_MODULES[name] = module
+        ANALYZER_INTERVALS[name] = list(module.DATA_REQUIREMENTS)
+        ANALYZER_VERSIONS[name] = memo.code_hash(module, screens, rsi_engine, indicators)
+        if scan:
+            UNIVERSE_ANALYZERS[name] = getattr(module, scan)
+        if gate:
+            BATCH_GATES[name] = getattr(module, gate)
+    ANALYZERS.sort(key=lambda analyzer: ANALYZER_NAMES.index(analyzer[0]))
+    return names
+
+def download_intervals(analyzers):
+    """Intervals that must be downloaded for the selected analyzers"""
+    intervals = {i for name in analyzers for i in ANALYZER_INTERVALS[name]}
+    return sorted({market_data.DERIVED[i][0] if i in market_data.DERIVED else i for i in intervals})
+
+def gated_intervals(analyzers):
+    """Intervals only the RSI analyzer needs once its daily gate passes.
+
+    The 1D RSI is checked first; 4H/1H are downloaded just for symbols
+    whose daily reading is already extreme, unless another selected
+    analyzer needs them anyway.
+    """
+    if 'rsi' not in analyzers:
+        return []
+    others = set(download_intervals([name for name in analyzers if name != 'rsi']))
+    gate = {market_data.DERIVED['1d'][0] if '1d' in market_data.DERIVED else '1d'}
+    return sorted(set(download_intervals(['rsi'])) - others - gate)
+
+def daily_gate(batch, state=None):
+    """Symbols of `batch` whose 1D RSI is overbought or oversold (read from `state` if given)"""
+    passing = []
+    with TELEMETRY.stage('daily_gate'):
+        for symbol in batch:
+            try:
+                if ANALYZER_MODULES['rsi'].passes_daily_gate(symbol, state=state):
+                    passing.append(symbol)
+            except Exception:
+                pass  # The RSI loader hits the same error and records it
+    return passing
+
+def prefetch_batch(batch, intervals=None):
+    """Download one batch of symbols for the given (default: all) intervals"""
+    with TELEMETRY.stage('fetch'):
+        try:
+            market_data.STORE.prefetch(batch, intervals)
+        except Exception as e:
+            print(f"⚠️ Batch download failed, its symbols are queued for retry: {e}")
+
+def classify_missing(symbol, name):
+    """Why an analyzer's loader returned None for `symbol` (None if it just screened it out)"""
+    module = ANALYZER_MODULES[name]
+    frames = []
+    for interval, period in module.DATA_REQUIREMENTS.items():
+        frame = market_data.STORE.peek(symbol, interval)
+        frames.append(market_data.slice_period(frame, period) if frame is not None else None)
+    return classify_frames(frames, module.MIN_BARS)
+
+def load_bundle(symbol, analyzers, failed=None, screened=None, loader_kwargs=None):
+    """Each selected analyzer's input for one symbol, then drop the raw bars.
+
+    A loader that raises is recorded as that analyzer's failure (and
+    appended to `failed`) and the analyzer gets no input; so does one
+    that returns None on usable bars, i.e. screened the symbol out
+    (appended to `screened`). `loader_kwargs` maps analyzers to extra
+    loader arguments, such as the RSI state store.
+    """
+    try:
+        with TELEMETRY.stage('load'):
+            bundle = {}
+            for name, loader, _ in ANALYZERS:
+                if name not in analyzers:
+                    continue
+                try:
+                    bundle[name] = loader(symbol, **(loader_kwargs or {}).get(name, {}))
+                except Exception as e:
+                    TELEMETRY.record_failure(symbol, name, classify_exception(e), repr(e))
+                    if failed is not None:
+                        failed.append(name)
+                    continue
+                if bundle[name] is None:
+                    kind = classify_missing(symbol, name)
+                    if kind:
+                        TELEMETRY.record_failure(symbol, name, kind)
+                    else:
+                        del bundle[name]
+                        if screened is not None:
+                            screened.append(name)
+            return bundle
+    finally:
+        market_data.STORE.release(symbol)
+        indicators.release(symbol)
+
+def analyze_bundle(symbol, bundle):
+    """Run every analyzer on one symbol's bundle; returns (results, failures, seconds per analyzer).
+
+    Inputs packed into a shared-memory arena arrive as ArenaRefs and are
+    read in place, then the segments are closed again.
+    """
+    load_analyzers(bundle)  # No-op unless this worker was spawned rather than forked
+    try:
+        return evaluate_bundle(symbol, {name: shm_arena.resolve(data) for name, data in bundle.items()})
+    finally:
+        shm_arena.detach(bundle)
+
+def evaluate_bundle(symbol, bundle):
+    """Run the analyzers on one symbol; they share its indicator graphs, dropped afterwards"""
+    results = {}
+    failures = []
+    timings = {}
+    try:
+        for name, _, evaluate in ANALYZERS:
+            if name not in bundle:
+                continue
+            data = bundle[name]
+            if data is None:
+                results[name] = None
+                continue
+            start = time.perf_counter()
+            try:
+                results[name] = evaluate(symbol, data)
+            except Exception as e:
+                results[name] = None
+                failures.append((name, classify_exception(e), repr(e)))
+            timings[name] = time.perf_counter() - start
+    finally:
+        indicators.release(symbol)
+    return results, failures, timings
+
+def new_stats():
+    return {
+        'analyzed': 0,
+        'no_data': {name: 0 for name in ANALYZER_NAMES},
+        'gated': {name: 0 for name in ANALYZER_NAMES},
+        'failures': {name: 0 for name in ANALYZER_NAMES},
+        'worker_errors': 0,
+        'downloads': 0,
+        'fetches_avoided': 0,
+        'memo': {'hits': 0, 'misses': 0},
+        'fetch': {'retried': 0, 'recovered': 0, 'missing': []},
+    }
+
+def arena_intervals(analyzers):
+    """{analyzer: interval} of the inputs shipped to worker processes"""
+    return {name: ANALYZER_INTERVALS[name][0] for name in analyzers
+            if name not in UNIVERSE_ANALYZERS and len(ANALYZER_INTERVALS[name]) == 1}
+
+def screen_batch(bundles, stats):
+    """Drop the inputs a batch gate screens out, so those analyzers never see them"""
+    for name, gate in BATCH_GATES.items():
+        rows = [k for k, bundle in enumerate(bundles) if bundle.get(name) is not None]
+        if not rows:
+            continue
+        with TELEMETRY.stage('batch_gate'):
+            passed = gate([bundles[k][name] for k in rows])
+        for k, ok in zip(rows, passed):
+            if not ok:
+                del bundles[k][name]
+                stats['gated'][name] += 1
+
+async def enqueue(items, analyzers, queue, io_executor, stats, arena=False, loader_kwargs=None):
+    """Load the bundles of (index, symbol) items, screen and queue them, packed into one arena if asked"""
+    loop = asyncio.get_running_loop()
+    bundles = []
+    for _, symbol in items:
+        failed, screened = [], []
+        bundles.append(await loop.run_in_executor(io_executor, load_bundle, symbol, analyzers, failed, screened,
+                                                  loader_kwargs))
+        for name in failed:
+            stats['failures'][name] += 1
+        for name in screened:
+            stats['gated'][name] += 1
+    screen_batch(bundles, stats)
+    packed = None
+    if arena and bundles:
+        packed = await loop.run_in_executor(io_executor, shm_arena.Arena, bundles, arena_intervals(analyzers))
+    for (index, symbol), bundle in zip(items, bundles):
+        await queue.put((index, symbol, bundle, packed))  # Blocks while analysis is behind
+
+async def produce(symbols, analyzers, queue, io_executor, stats, prefetch=True, arena=False, loader_kwargs=None):
+    """Fetch stage: fill the queue with per-symbol bundles.
+
+    Symbols with a fetch on the retry queue are held back and queued
+    once it succeeds or runs out of tries, so a throttled batch delays
+    them instead of dropping them; results keep universe order by index.
+    With `arena`, bundles are packed into shared memory and queued as
+    (index, symbol, bundle, arena) for the consumer to release.
+    `loader_kwargs` reaches the loaders and the RSI daily gate.
+    """
+    loop = asyncio.get_running_loop()
+    gated = gated_intervals(analyzers) if prefetch else []
+    intervals = [i for i in download_intervals(analyzers) if i not in gated]
+    held = {}
+    index = 0
+    for batch in market_data.chunks(symbols, market_data.BATCH_SIZE):
+        if prefetch:
+            await loop.run_in_executor(io_executor, prefetch_batch, batch, intervals)
+        if gated:
+            passing = await loop.run_in_executor(io_executor, daily_gate, batch,
+                                                 (loader_kwargs or {}).get('rsi', {}).get('state'))
+            if passing:
+                await loop.run_in_executor(io_executor, prefetch_batch, passing, gated)
+        ready = []
+        for symbol in batch:
+            if market_data.RETRY.waiting(symbol):
+                held[symbol] = index
+            else:
+                ready.append((index, symbol))
+            index += 1
+        await enqueue(ready, analyzers, queue, io_executor, stats, arena, loader_kwargs)
+
+    # Retry queue: refetch failed keys as their backoff (and any breaker cooldown) runs out
+    while held:
+        due = market_data.RETRY.next_due()
+        if due is not None:
+            reopens = market_data.BREAKER.reopens_at() or 0
+            await asyncio.sleep(max(0, max(due, reopens) - time.monotonic()))
+            for interval, retry in market_data.RETRY.ready().items():
+                await loop.run_in_executor(io_executor, prefetch_batch, retry, [interval])
+        ready = sorted((i, symbol) for symbol, i in held.items() if not market_data.RETRY.waiting(symbol))
+        for _, symbol in ready:
+            del held[symbol]
+        await enqueue(ready, analyzers, queue, io_executor, stats, arena, loader_kwargs)
+
+def recall(memo_store, symbol, bundle):
+    """Split off memoized results: returns ({name: result} hits, {name: memo key} misses)"""
+    hits, keys = {}, {}
+    if memo_store is None:
+        return hits, keys
+    for name in list(bundle):
+        if bundle[name] is None:
+            continue
+        key = memo_store.key(name, symbol, shm_arena.resolve(bundle[name]), ANALYZER_VERSIONS[name])
+        found, result = memo_store.get(key)
+        if found:
+            hits[name] = result
+            del bundle[name]
+        else:
+            keys[name] = key
+    return hits, keys
+
+async def consume(queue, results, universe_inputs, stats, pool, total, memo_store=None):
+    """Analysis stage: hand bundles to the process pool until a sentinel arrives"""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        index, symbol, bundle, arena = item
+        try:
+            for name, data in bundle.items():
+                if data is None:
+                    stats['no_data'][name] += 1
+            for name in universe_inputs:
+                universe_inputs[name][index] = (symbol, bundle.pop(name, None))
+            hits, keys = recall(memo_store, symbol, bundle)
+            try:
+                if pool is None or not bundle:
+                    outcome, failures, timings = analyze_bundle(symbol, bundle)
+                else:
+                    outcome, failures, timings = await loop.run_in_executor(pool, analyze_bundle, symbol, bundle)
+            except Exception as e:
+                # The worker itself died (e.g. unpicklable data, killed process)
+                stats['worker_errors'] += 1
+                TELEMETRY.record_failure(symbol, 'worker', classify_exception(e), repr(e))
+                print(f"❌ Worker failed on {symbol}: {e}")
+                continue
+        finally:
+            if arena is not None:
+                arena.done()
+        for name, kind, error in failures:
+            stats['failures'][name] += 1
+            TELEMETRY.record_failure(symbol, name, kind, error)
+        for name, seconds in timings.items():
+            TELEMETRY.add_time(TELEMETRY.analyzers, name, seconds)
+        failed = {name for name, _, _ in failures}
+        for name, key in keys.items():
+            if name not in failed:
+                memo_store.put(key, outcome[name])
+        outcome.update(hits)
+        results[index] = outcome
+        stats['analyzed'] += 1
+        if stats['analyzed'] % 20 == 0:
+            print(f"   [{stats['analyzed']:3d}/{total}] stocks analyzed")
+
+async def run(symbols, analyzers=None, workers=None, queue_size=None, prefetch=True, rsi_store=None, memo_store=None):
+    """Two-stage scan of `symbols`; returns ({analyzer: [results in symbol order]}, stats).
+
+    `analyzers` limits the scan (and the intervals fetched) to those names.
+    prefetch=False reads bars already in the store (the daemon refreshes
+    them itself); `rsi_store` is a long-lived RSIStateStore to advance.
+    Results for bar windows analyzed before come from `memo_store`.
+    """
+    analyzers = load_analyzers(analyzers)
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    queue = asyncio.Queue(maxsize=queue_size or QUEUE_SIZE)
+    results = {}
+    universe_inputs = {name: {} for name in UNIVERSE_ANALYZERS if name in analyzers}
+    stats = new_stats()
+    consumers = max(workers, 1)
+    counters = dict(market_data.STATS)
+    trips = market_data.BREAKER.trips
+    market_data.RETRY.reset()
+    if memo_store is None and memo.ENABLED:
+        memo_store = memo.MemoStore()
+
+    # Worker inputs go through shared memory instead of being pickled per task
+    arena = workers > 0 and shm_arena.ENABLED
+    if arena:
+        shm_arena.prepare()
+        shm_arena.reset_stats()
+
+    # Streaming RSI: advance persisted Wilder averages instead of recomputing;
+    # the lazy RSI loader and daily gate screen on the same readings
+    if rsi_store is None and rsi_state.ENABLED:
+        rsi_store = rsi_state.RSIStateStore()
+    scan_kwargs = {'rsi': {'state': rsi_store}} if rsi_store is not None else {}
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        with ThreadPoolExecutor(max_workers=1) as io_executor:
+            tasks = [asyncio.create_task(consume(queue, results, universe_inputs, stats, pool, len(symbols), memo_store)) for _ in range(consumers)]
+            try:
+                if analyzers:
+                    await produce(symbols, analyzers, queue, io_executor, stats, prefetch, arena, scan_kwargs)
+            finally:
+                for _ in tasks:
+                    await queue.put(None)
+            await asyncio.gather(*tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        shm_arena.release_all()
+    if arena:
+        stats['arena'] = dict(shm_arena.STATS)
+
+    for name, scan in UNIVERSE_ANALYZERS.items():
+        if name not in universe_inputs:
+            continue
+        indices = []
+        keys = {}
+        for i in sorted(i for i in universe_inputs[name] if i in results):
+            symbol, data = universe_inputs[name][i]
+            hits, misses = recall(memo_store, symbol, {name: data})
+            if name in hits:
+                results[i][name] = hits[name]
+                continue
+            indices.append(i)
+            keys[i] = misses.get(name)
+        inputs = [universe_inputs[name][i] for i in indices]
+        start = time.perf_counter()
+        try:
+            outcomes = scan([symbol for symbol, _ in inputs], [data for _, data in inputs],
+                            **scan_kwargs.get(name, {}))
+        except Exception as e:
+            stats['failures'][name] += len(indices)
+            for symbol, _ in inputs:
+                TELEMETRY.record_failure(symbol, name, classify_exception(e), repr(e))
+            print(f"❌ {name} scan failed: {e}")
+            outcomes = [None] * len(indices)
+            keys = {}
+        TELEMETRY.add_time(TELEMETRY.analyzers, name, time.perf_counter() - start)
+        for i, outcome in zip(indices, outcomes):
+            results[i][name] = outcome
+            if keys.get(i):
+                memo_store.put(keys[i], outcome)
+
+    if 'rsi' in scan_kwargs and 'rsi' in universe_inputs:
+        scan_kwargs['rsi']['state'].save()
+        stats['rsi_state'] = scan_kwargs['rsi']['state'].stats
+
+    if memo_store is not None:
+        memo_store.save()
+        stats['memo'] = dict(memo_store.stats)
+
+    stats['fetch'] = dict(market_data.RETRY.report(), breaker_trips=market_data.BREAKER.trips - trips,
+                          **market_data.LIMITER.snapshot())
+
+    for key in ('downloads', 'fetches_avoided'):
+        stats[key] = market_data.STATS[key] - counters[key]
+
+    ordered = {name: [] for name in ANALYZER_NAMES}
+    for index in sorted(results):
+        for name, _, _ in ANALYZERS:
+            if results[index].get(name):
+                ordered[name].append(results[index][name])
+    return ordered, stats
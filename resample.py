@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+# NSE trading calendar (09:15-15:30 IST sessions, exchange holidays)
+CALENDAR = 'XNSE'
+SESSION_TZ = 'Asia/Kolkata'
+
+AGGREGATION = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+_calendar = None
+
+def calendar():
+    global _calendar
+    if _calendar is None:
+        import pandas_market_calendars as mcal  # Slow import, deferred until a calendar is needed
+        _calendar = mcal.get_calendar(CALENDAR)
+    return _calendar
+
+# (first date, last date, schedule) covering every date range asked for so far
+_schedule = None
+
+def sessions(start, end):
+    """Exchange schedule covering `start`..`end` (dates).
+
+    Building a schedule is slow, so one is kept and only rebuilt, widened
+    to the union of both ranges, when a request falls outside it. Callers
+    reindex or slice it by date.
+    """
+    global _schedule
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if _schedule is None or start < _schedule[0] or end > _schedule[1]:
+        if _schedule is not None:
+            start, end = min(start, _schedule[0]), max(end, _schedule[1])
+        _schedule = (start, end, calendar().schedule(start_date=start, end_date=end))
+    return _schedule[2]
+
+def session_bounds(index):
+    """Session date, open and close (UTC ns) for each timestamp in `index`"""
+    local = index.tz_convert(SESSION_TZ) if index.tz is not None else index.tz_localize(SESSION_TZ)
+    dates = local.tz_localize(None).normalize()
+    schedule = sessions(dates.min(), dates.max())
+    opens = schedule['market_open'].reindex(dates)
+    closes = schedule['market_close'].reindex(dates)
+    return dates, opens, closes
+
+def resample_sessions(frame, hours=4):
+    """Aggregate intraday bars into session-aligned candles.
+
+    Buckets are `hours` long and start at each session's 09:15 open, so a
+    4H session yields 09:15-13:15 and 13:15-15:30. hours=None builds one
+    daily candle per session, indexed by date like Yahoo's daily bars.
+    Bars outside a session (holidays, pre-open prints) are dropped.
+    """
+    if frame.empty:
+        return frame
+    dates, opens, closes = session_bounds(frame.index)
+    ts = frame.index.tz_convert('UTC') if frame.index.tz is not None else frame.index.tz_localize(SESSION_TZ).tz_convert('UTC')
+    ts = ts.asi8
+    open_ns = opens.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    close_ns = closes.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    in_session = opens.notna().to_numpy() & (ts >= open_ns) & (ts < close_ns)
+
+    bars = frame[in_session]
+    if hours is None:
+        keys = dates[in_session]
+    else:
+        width = int(pd.Timedelta(hours=hours).value)
+        start = open_ns[in_session] + (ts[in_session] - open_ns[in_session]) // width * width
+        keys = pd.DatetimeIndex(start).tz_localize('UTC').tz_convert(frame.index.tz or SESSION_TZ)
+
+    aggregation = {col: how for col, how in AGGREGATION.items() if col in bars.columns}
+    return bars.groupby(keys).agg(aggregation)
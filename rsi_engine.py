@@ -0,0 +1,76 @@
+import numpy as np
+
+def stack_closes(close_arrays, length=None):
+    """Stack per-symbol close arrays into a (symbols x bars) matrix.
+
+    Rows are right-aligned on their most recent bar and NaN-padded at the
+    start, so shorter histories simply begin later in the matrix.
+    """
+    length = length or max((len(c) for c in close_arrays), default=0)
+    matrix = np.full((len(close_arrays), length), np.nan)
+    for row, closes in enumerate(close_arrays):
+        closes = np.asarray(closes, dtype=np.float64)[-length:] if length else closes[:0]
+        if len(closes):
+            matrix[row, length - len(closes):] = closes
+    return matrix
+
+def first_valid(matrix):
+    """Column of the first non-NaN value in each row (row length if none)"""
+    valid = ~np.isnan(matrix)
+    return np.where(valid.any(axis=1), valid.argmax(axis=1), matrix.shape[1])
+
+def wilder_rsi(closes, period=14):
+    """Full Wilder RSI series for every row of a close matrix in one pass.
+
+    Matches calculate_rsi bar for bar: rsi[:, t] is exactly what
+    calculate_rsi returns for that row's closes up to and including t
+    (NaN while there is not enough history).
+    """
+    closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+    n_rows, n_bars = closes.shape
+    rsi = np.full((n_rows, n_bars), np.nan)
+    if n_bars < period + 2:
+        return rsi
+
+    deltas = np.diff(closes, axis=1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    # Seed each row from its own first `period` deltas, summed left to right
+    start = first_valid(closes)
+    seeded = start + period + 1 < n_bars
+    rows = np.nonzero(seeded)[0]
+    avg_gain = np.zeros(n_rows)
+    avg_loss = np.zeros(n_rows)
+    for k in range(period):
+        avg_gain[rows] += gains[rows, start[rows] + k]
+        avg_loss[rows] += losses[rows, start[rows] + k]
+    avg_gain /= period
+    avg_loss /= period
+
+    # Column t uses averages updated through delta t-2 (calculate_rsi's convention)
+    seed_col = start + period + 1
+    for t in range(int(seed_col[rows].min()) if len(rows) else n_bars, n_bars):
+        update = seed_col < t
+        if update.any():
+            avg_gain[update] = (avg_gain[update] * (period - 1) + gains[update, t - 2]) / period
+            avg_loss[update] = (avg_loss[update] * (period - 1) + losses[update, t - 2]) / period
+        live = seed_col <= t
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value = 100 - (100 / (1 + avg_gain / avg_loss))
+        rsi[live, t] = np.where(avg_loss[live] == 0, 100.0, value[live])
+    return rsi
+
+def last_rsi(closes, period=14):
+    """Most recent RSI per row (NaN where history is too short)"""
+    return wilder_rsi(closes, period)[:, -1]
+
+def classify(rsi, overbought=70, oversold=30):
+    """Boolean (overbought, oversold) masks for an RSI array"""
+    return rsi >= overbought, rsi <= oversold
+
+def triple_screen(rsi_by_timeframe, overbought=70, oversold=30):
+    """(overbought, oversold) masks requiring every timeframe to agree"""
+    masks = [classify(rsi, overbought, oversold) for rsi in rsi_by_timeframe]
+    return (np.logical_and.reduce([m[0] for m in masks]),
+            np.logical_and.reduce([m[1] for m in masks]))
@@ -0,0 +1,126 @@
+import os
+import json
+import numpy as np
+import ohlcv_cache
+
+# Persisted Wilder state lives next to the bar cache
+STATE_PATH = os.path.join(ohlcv_cache.CACHE_DIR, 'rsi_state.json') if ohlcv_cache.ENABLED else None
+
+# Opt-in, since streamed averages remember more history than a windowed recompute
+ENABLED = os.getenv('NSE_INCREMENTAL_RSI', '0') == '1'
+
+# Full recompute every N incremental updates; reseed if the two differ by more than this many RSI points
+VERIFY_EVERY = int(os.getenv('NSE_RSI_VERIFY_EVERY', '20'))
+DRIFT_TOLERANCE = float(os.getenv('NSE_RSI_DRIFT_TOLERANCE', '1.0'))
+
+def gains_losses(closes):
+    deltas = np.diff(np.asarray(closes, dtype=np.float64))
+    return np.where(deltas > 0, deltas, 0.0).tolist(), np.where(deltas < 0, -deltas, 0.0).tolist()
+
+def rsi_from_averages(avg_gain, avg_loss):
+    if avg_loss == 0:
+        return 100
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+def seed_averages(closes, period=14):
+    """Wilder averages behind calculate_rsi's value for `closes` (None if too short).
+
+    calculate_rsi reports the RSI of the penultimate bar, so the averages
+    cover deltas up to and including closes[-2].
+    """
+    gains, losses = gains_losses(closes)
+    if len(gains) <= period:
+        return None
+    avg_gain = sum(gains[:period]) / period
+    avg_loss = sum(losses[:period]) / period
+    for i in range(period, len(gains) - 1):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+    return avg_gain, avg_loss
+
+class RSIStateStore:
+    """Wilder average gain/loss per (symbol, timeframe), advanced by new bars only.
+
+    Each entry is anchored on the penultimate bar of the last update (a
+    completed candle): its close and timestamp plus the averages through
+    it. A later call finds the anchor in the new data and folds in only
+    the bars after it. If the anchor is missing, its close was revised,
+    or the periodic check against a full recompute drifts too far, the
+    entry is reseeded from the data in hand.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.states = {}
+        self.stats = {'unchanged': 0, 'incremental': 0, 'reseeded': 0, 'drift_reseeds': 0}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.states = json.load(f)
+            except Exception:
+                self.states = {}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.states, f)
+        os.replace(tmp, self.path)
+
+    def reseed(self, key, closes, timestamps, period):
+        averages = seed_averages(closes, period)
+        if averages is None:
+            self.states.pop(key, None)
+            return None
+        self.states[key] = {
+            'period': period,
+            'avg_gain': averages[0],
+            'avg_loss': averages[1],
+            'last_close': float(closes[-2]),
+            'last_ts': int(timestamps[-2].astype('datetime64[ns]').astype(np.int64)),
+            'updates': 0,
+        }
+        self.stats['reseeded'] += 1
+        return rsi_from_averages(*averages)
+
+    def rsi(self, key, data, period=14):
+        """Same value as calculate_rsi(data, period), in O(new bars) when state exists"""
+        closes = np.asarray(data['close'], dtype=np.float64)
+        timestamps = np.asarray(data.timestamps)
+        if len(closes) < period + 2:
+            return None
+
+        state = self.states.get(key)
+        if state is None or state['period'] != period:
+            return self.reseed(key, closes, timestamps, period)
+
+        ts = timestamps.astype('datetime64[ns]').astype(np.int64)
+        anchor = int(np.searchsorted(ts, state['last_ts']))
+        if anchor >= len(ts) - 1 or ts[anchor] != state['last_ts'] \
+                or not np.isclose(closes[anchor], state['last_close'], rtol=1e-9, atol=0.0):
+            return self.reseed(key, closes, timestamps, period)
+
+        new_anchor = len(closes) - 2
+        if new_anchor == anchor:
+            self.stats['unchanged'] += 1
+            return rsi_from_averages(state['avg_gain'], state['avg_loss'])
+
+        gains, losses = gains_losses(closes[anchor:new_anchor + 1])
+        avg_gain, avg_loss = state['avg_gain'], state['avg_loss']
+        for gain, loss in zip(gains, losses):
+            avg_gain = (avg_gain * (period - 1) + gain) / period
+            avg_loss = (avg_loss * (period - 1) + loss) / period
+        value = rsi_from_averages(avg_gain, avg_loss)
+
+        state.update(avg_gain=avg_gain, avg_loss=avg_loss, last_close=float(closes[new_anchor]),
+                     last_ts=int(ts[new_anchor]), updates=state['updates'] + 1)
+        self.stats['incremental'] += 1
+
+        if state['updates'] % VERIFY_EVERY == 0:
+            full = rsi_from_averages(*seed_averages(closes, period))
+            if abs(full - value) > DRIFT_TOLERANCE:
+                self.stats['drift_reseeds'] += 1
+                return self.reseed(key, closes, timestamps, period)
+        return value
@@ -0,0 +1,164 @@
+import numpy as np
+from rsi_engine import stack_closes
+
+def stack_ohlc(datas, length=None, fields=('open', 'high', 'low', 'close')):
+    """Stack per-symbol OHLCV data into right-aligned, NaN-padded matrices.
+
+    Returns ({field: (symbols x bars) matrix}, history lengths). Symbols
+    whose data is None get an all-NaN row and length 0.
+    """
+    empty = np.empty(0)
+    matrices = {f: stack_closes([d[f] if d is not None else empty for d in datas], length)
+                for f in fields}
+    lengths = np.array([len(d) if d is not None else 0 for d in datas])
+    return matrices, lengths
+
+def engulfing_masks(open_, high, low, close):
+    """(bullish, bearish) masks for the engulfing pattern on bars -3/-2.
+
+    Batch version of is_engulfing_candle_4h; rows shorter than 3 bars
+    (NaN-padded) never match.
+    """
+    if open_.shape[1] < 3:
+        no_match = np.zeros(open_.shape[0], dtype=bool)
+        return no_match, no_match.copy()
+    prev_open, prev_high, prev_low, prev_close = open_[:, -2], high[:, -2], low[:, -2], close[:, -2]
+    before_open, before_high, before_low, before_close = open_[:, -3], high[:, -3], low[:, -3], close[:, -3]
+
+    engulfs = ((np.minimum(prev_open, prev_close) <= np.minimum(before_open, before_close)) &
+               (np.maximum(prev_open, prev_close) >= np.maximum(before_open, before_close)) &
+               (prev_low <= before_low) &
+               (prev_high >= before_high))
+    bullish = engulfs & (prev_close > prev_open) & (before_close < before_open)
+    bearish = engulfs & (prev_close < prev_open) & (before_close > before_open)
+    return bullish, bearish
+
+def swing_low_mask(low, lengths, window=5, full_window=True):
+    """Latest low at or below the previous `window` lows.
+
+    full_window=True mirrors is_swing_low (needs window+1 bars);
+    False mirrors is_swing_low_hourly (any non-empty lookback).
+    """
+    current = low[:, -1] if low.shape[1] else np.full(low.shape[0], np.nan)
+    lookback = low[:, -window - 1:-1]
+    enough = lengths >= (window + 1 if full_window else 2)
+    if lookback.shape[1] == 0:
+        return np.zeros(len(current), dtype=bool)
+    # Rows without enough history are masked out anyway; +inf keeps nanmin quiet on them
+    floor = np.nanmin(np.where(enough[:, None], lookback, np.inf), axis=1)
+    return enough & (current <= floor)
+
+def discount_mask(high, low, close, threshold=0.35, inclusive=True, require_range=True):
+    """Latest close at least `threshold` below the highest high in the matrix.
+
+    inclusive/require_range mirror calculate_discount_zone (>=, flat range
+    rejected); inclusive=False, require_range=False mirror
+    calculate_discount_hourly (>).
+    """
+    if close.shape[1] == 0:
+        return np.zeros(close.shape[0], dtype=bool)
+    valid = ~np.isnan(close[:, -1])
+    with np.errstate(all='ignore'):
+        period_high = np.max(np.where(np.isnan(high), -np.inf, high), axis=1)
+        discount = (period_high - close[:, -1]) / period_high
+        mask = discount >= threshold if inclusive else discount > threshold
+        mask &= valid & (period_high != 0) & np.isfinite(period_high)
+        if require_range:
+            period_low = np.min(np.where(np.isnan(low), np.inf, low), axis=1)
+            mask &= period_high != period_low
+    return mask
+
+def bullish_run_lengths(open_, close):
+    """run[i] = number of consecutive bullish candles starting at bar i (O(n))"""
+    return run_lengths(np.asarray(close) > np.asarray(open_))
+
+def run_lengths(bullish):
+    """run[i] = number of consecutive True values starting at position i"""
+    bullish = np.asarray(bullish, dtype=bool)
+    idx = np.arange(len(bullish))
+    reverse = bullish[::-1]
+    last_break = np.maximum.accumulate(np.where(reverse, -1, idx)) if len(idx) else idx
+    return (idx - last_break)[::-1]
+
+def last_true_index(mask):
+    """For each position, index of the latest True at or before it (-1 if none)"""
+    idx = np.arange(len(mask))
+    return np.maximum.accumulate(np.where(mask, idx, -1)) if len(idx) else idx
+
+def latest_match_series(n, newest, oldest, max_run, evaluate):
+    """Evaluate a "most recent matching candidate" scan as of every bar.
+
+    As of bar t the scan walks candidates i from t+1-newest down to
+    max(t+1-oldest, 0)+1 and returns the outcome of the first match, or
+    False. A candidate's run is capped at min(max_run, t-i) bars, so it
+    never sees data after t. evaluate(i, cap) returns (matched, outcome)
+    arrays. Candidates far enough back always get the full cap and are
+    resolved with a running "last match" index. Only the few candidates
+    near t are checked one by one, so the whole series is O(n).
+    """
+    t = np.arange(n)
+    lower = np.maximum(t + 1 - oldest, 0) + 1
+    result = np.zeros(n, dtype=bool)
+    decided = np.zeros(n, dtype=bool)
+    if n == 0:
+        return result
+
+    # Recent candidates whose run is cut short by the end of the data
+    for d in range(newest - 1, max_run):
+        i = t - d
+        matched, outcome = evaluate(np.clip(i, 0, n - 1), np.full(n, d))
+        hit = ~decided & (i >= lower) & matched
+        result[hit] = outcome[hit]
+        decided |= hit
+
+    # Older candidates always see the full max_run bars
+    matched, outcome = evaluate(t, np.full(n, max_run))
+    last = last_true_index(matched)
+    upper = t - max(newest - 1, max_run)
+    j = np.where(upper >= 0, last[np.clip(upper, 0, None)], -1)
+    hit = ~decided & (j >= lower)
+    result[hit] = outcome[j[hit]]
+    return result
+
+def order_block_series(open_, close, newest=6, oldest=25, max_run=5, run_bounds=(3, 5), rally_threshold=0.006,
+                       run=None, bearish=None):
+    """detect_order_block as of every bar: a bearish candle followed by a
+    run of bullish candles within run_bounds that rallied more than
+    rally_threshold. Defaults are the daily detector's; the hourly one
+    uses newest=10, oldest=100, max_run=14, run_bounds=(2, 12), 0.003.
+    `run` and `bearish` may be passed in precomputed (an IndicatorGraph's).
+    """
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    run = bullish_run_lengths(open_, close) if run is None else run
+    bearish = close < open_ if bearish is None else bearish
+
+    def evaluate(i, cap):
+        first = np.clip(i + 1, 0, n - 1)
+        count = np.minimum(run[first], cap)
+        matched = bearish[i] & (count >= run_bounds[0]) & (count <= run_bounds[1])
+        first_close = close[first]
+        last_close = close[np.clip(i + count, 0, n - 1)]
+        with np.errstate(all='ignore'):
+            outcome = (last_close - first_close) / first_close > rally_threshold
+        return matched, outcome
+
+    return latest_match_series(n, newest, oldest, max_run, evaluate)
+
+def fair_value_gap_series(open_, close, newest=7, oldest=15, max_run=6, run_bounds=(3, 6), run=None, bearish=None):
+    """detect_fair_value_gap as of every bar: a run of bullish candles
+    within run_bounds whose next candle closes bearish.
+    """
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    run = bullish_run_lengths(open_, close) if run is None else run
+    bearish = close < open_ if bearish is None else bearish
+
+    def evaluate(i, cap):
+        count = np.minimum(run[i], cap)
+        matched = (count >= run_bounds[0]) & (count <= run_bounds[1])
+        return matched, bearish[np.clip(i + count, 0, n - 1)]
+
+    return latest_match_series(n, newest, oldest, max_run, evaluate)
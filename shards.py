@@ -0,0 +1,79 @@
+import os
+import json
+import zlib
+from glob import glob
+from datetime import datetime
+import freshness
+
+def parse_shard(spec):
+    """'2/4' -> (2, 4); shards are numbered from 1"""
+    index, count = (int(part) for part in spec.split('/'))
+    if not 1 <= index <= count:
+        raise ValueError(f"Bad shard {spec!r}: expected i/N with 1 <= i <= N")
+    return index, count
+
+def shard_of(symbol, count):
+    return zlib.crc32(symbol.encode()) % count + 1
+
+def select(symbols, index, count):
+    """Shard `index` of `count`, in universe order.
+
+    Symbols are assigned by a hash of the ticker, so the split is the same
+    on every machine and a symbol keeps its shard as the universe changes.
+    """
+    return [s for s in symbols if shard_of(s, count) == index]
+
+def shard_path(directory, index, count):
+    return os.path.join(directory, f"shard-{index}-of-{count}.json")
+
+def save(directory, index, count, universe, results):
+    """Write one shard's signals along with where its symbols sit in the universe"""
+    symbols = select(universe, index, count)
+    position = {s: i for i, s in enumerate(universe)}
+    payload = {
+        'shard': index,
+        'count': count,
+        'universe': freshness.universe_key(universe),
+        'universe_size': len(universe),
+        'symbols': symbols,
+        'positions': [position[s] for s in symbols],
+        'results': results,
+        'finished': datetime.now().isoformat(timespec='seconds'),
+    }
+    os.makedirs(directory, exist_ok=True)
+    path = shard_path(directory, index, count)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+    return path
+
+def merge(directory):
+    """Combine every shard file in `directory` into ({analyzer: [signals in universe order]}, universe size).
+
+    Raises if shards are missing or come from different universes or shard counts.
+    """
+    payloads = []
+    for path in sorted(glob(os.path.join(directory, 'shard-*-of-*.json'))):
+        with open(path) as f:
+            payloads.append(json.load(f))
+    if not payloads:
+        raise FileNotFoundError(f"No shard results in {directory}")
+
+    first = payloads[0]
+    if any(p['count'] != first['count'] or p['universe'] != first['universe'] for p in payloads):
+        raise ValueError("Shard files come from different universes or shard counts")
+    missing = sorted(set(range(1, first['count'] + 1)) - {p['shard'] for p in payloads})
+    if missing:
+        raise ValueError(f"Missing shards: {missing} of {first['count']}")
+
+    position = {}
+    for p in payloads:
+        position.update({s.replace('.NS', ''): i for s, i in zip(p['symbols'], p['positions'])})
+    merged = {}
+    for p in payloads:
+        for name, signals in p['results'].items():
+            merged.setdefault(name, []).extend(signals)
+    for signals in merged.values():
+        signals.sort(key=lambda result: position.get(result['symbol'], len(position)))
+    return merged, first['universe_size']
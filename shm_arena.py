@@ -0,0 +1,164 @@
+import os
+import atexit
+from collections import namedtuple
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from ohlcv import OHLCV
+
+# Set NSE_SHM_ARENA=0 to pickle bundles to the analysis workers instead
+ENABLED = os.getenv('NSE_SHM_ARENA', '1') == '1'
+
+# Price/volume storage; float32 halves the arena but rounds prices to ~7 digits
+DTYPE = np.dtype(os.getenv('NSE_ARENA_DTYPE', 'float64'))
+
+# Where one symbol's bars sit in a segment: `total` bars per column, ours at [start, start + length)
+ArenaRef = namedtuple('ArenaRef', 'segment total start length dtype tz')
+
+# Segments this process has open, by name (created here or attached)
+ATTACHED = {}
+
+# Arenas created by this process and not yet released
+LIVE = set()
+
+STATS = {'arenas': 0, 'segments': 0, 'live_bytes': 0, 'peak_bytes': 0}
+
+def prepare():
+    """Start the resource tracker before worker processes fork, so they all share it.
+
+    A worker that started its own tracker would unlink our segments
+    when it exits; the shared one unlinks them only if we crash.
+    """
+    resource_tracker.ensure_running()
+
+def segment_size(total, dtype):
+    return total * (8 + len(OHLCV.FIELDS) * dtype.itemsize)
+
+def view(buf, ref):
+    """OHLCV over the shared buffer, no copy"""
+    dtype = np.dtype(ref.dtype)
+    timestamps = np.ndarray(ref.length, 'datetime64[ns]', buf, offset=ref.start * 8)
+    columns = []
+    for k in range(len(OHLCV.FIELDS)):
+        offset = ref.total * 8 + (k * ref.total + ref.start) * dtype.itemsize
+        columns.append(np.ndarray(ref.length, dtype, buf, offset=offset))
+    return OHLCV(timestamps, *columns, tz=ref.tz)
+
+class Arena:
+    """One batch's worker inputs packed into a shared-memory segment per interval.
+
+    Each segment holds every symbol's timestamps, then each OHLCV column,
+    back to back. Packing swaps the bundle's OHLCV for an ArenaRef, which
+    pickles in a few bytes; workers attach by name and read views. The
+    creating process owns the segments and unlinks them once every symbol
+    in the batch is done (or at exit).
+    """
+
+    def __init__(self, bundles, intervals, dtype=DTYPE):
+        self.pending = len(bundles)
+        self.segments = {}
+        totals = {}
+        for bundle in bundles:
+            for name, interval in intervals.items():
+                if isinstance(bundle.get(name), OHLCV):
+                    totals[interval] = totals.get(interval, 0) + len(bundle[name])
+
+        try:
+            for interval, total in totals.items():
+                if total:
+                    shm = shared_memory.SharedMemory(create=True, size=segment_size(total, dtype))
+                    self.segments[interval] = shm
+                    ATTACHED[shm.name] = shm
+
+            cursors = dict.fromkeys(totals, 0)
+            for bundle in bundles:
+                for name, interval in intervals.items():
+                    data = bundle.get(name)
+                    if not isinstance(data, OHLCV) or not len(data):
+                        continue
+                    shm = self.segments[interval]
+                    ref = ArenaRef(shm.name, totals[interval], cursors[interval], len(data), dtype.str, data.tz)
+                    packed = view(shm.buf, ref)
+                    packed.timestamps[:] = data.timestamps
+                    for field in OHLCV.FIELDS:
+                        packed[field][:] = data[field]
+                    del packed
+                    bundle[name] = ref
+                    cursors[interval] += len(data)
+        except Exception:
+            self.release()
+            raise
+
+        self.nbytes = sum(shm.size for shm in self.segments.values())
+        LIVE.add(self)
+        STATS['arenas'] += 1
+        STATS['segments'] += len(self.segments)
+        STATS['live_bytes'] += self.nbytes
+        STATS['peak_bytes'] = max(STATS['peak_bytes'], STATS['live_bytes'])
+
+    def done(self):
+        """One symbol of the batch is analyzed; release after the last"""
+        self.pending -= 1
+        if self.pending <= 0:
+            self.release()
+
+    def release(self):
+        for shm in self.segments.values():
+            ATTACHED.pop(shm.name, None)
+            try:
+                shm.close()
+            except BufferError:
+                pass  # A view is still alive; the mapping goes when it does
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.segments = {}
+        if self in LIVE:
+            LIVE.discard(self)
+            STATS['live_bytes'] -= self.nbytes
+
+def release_all():
+    """Unlink every arena this process still owns (end of a run, or a crash)"""
+    for arena in list(LIVE):
+        arena.release()
+
+atexit.register(release_all)
+
+def reset_stats():
+    STATS.update(arenas=0, segments=0, live_bytes=sum(a.nbytes for a in LIVE))
+    STATS['peak_bytes'] = STATS['live_bytes']
+
+def resolve(data):
+    """OHLCV for an ArenaRef (attaching its segment if needed); anything else is returned as is"""
+    if not isinstance(data, ArenaRef):
+        return data
+    shm = ATTACHED.get(data.segment)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=data.segment)
+        ATTACHED[data.segment] = shm
+    return view(shm.buf, data)
+
+def detach(bundle):
+    """Close the segments `bundle` attached in this process (its views must be gone)"""
+    owned = {shm.name for arena in LIVE for shm in arena.segments.values()}
+    for data in bundle.values():
+        if isinstance(data, ArenaRef) and data.segment not in owned:
+            shm = ATTACHED.pop(data.segment, None)
+            if shm is not None:
+                try:
+                    shm.close()
+                except BufferError:
+                    pass
+
+def forget():
+    """In a forked child: drop the parent's segments without unlinking them"""
+    for shm in ATTACHED.values():
+        try:
+            shm.close()
+        except BufferError:
+            pass
+    ATTACHED.clear()
+    LIVE.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=forget)
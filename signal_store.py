@@ -0,0 +1,153 @@
+import os
+import json
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+import ohlcv_cache
+
+# Every run's signals, kept next to the bar cache
+DB_PATH = os.path.join(ohlcv_cache.CACHE_DIR, 'signals.db') if ohlcv_cache.ENABLED else None
+
+# Set NSE_SIGNAL_STORE=0 to stop recording runs
+ENABLED = os.getenv('NSE_SIGNAL_STORE', '1') == '1'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    analyzer TEXT NOT NULL,
+    run_ts TEXT NOT NULL,
+    universe TEXT,
+    signals INTEGER NOT NULL,
+    PRIMARY KEY (analyzer, run_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS signals (
+    run_ts TEXT NOT NULL,
+    analyzer TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    score REAL NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (run_ts, analyzer, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS signals_by_score ON signals (analyzer, run_ts, score DESC);
+CREATE INDEX IF NOT EXISTS signals_by_symbol ON signals (symbol, analyzer, run_ts);
+"""
+
+def rsi_depth(stock):
+    """Mean distance of the three RSIs past their threshold (30 oversold, 70 overbought)"""
+    values = [stock['1D_RSI'], stock['4H_RSI'], stock['1H_RSI']]
+    if 'OVERSOLD' in stock.get('confluence', ''):
+        return sum(30 - v for v in values) / 3
+    return sum(v - 70 for v in values) / 3
+
+# Analyzer -> how good one of its signals is (higher is better)
+SCORES = {
+    'smc': lambda stock: stock['confluence_score'],
+    'bajaj': lambda stock: stock['priority_score'],
+    'rsi': rsi_depth,
+    'engulfing': lambda stock: abs(stock['change_pct']),
+}
+
+def score(name, stock):
+    try:
+        return float(SCORES[name](stock))
+    except Exception:
+        return 0.0
+
+def ranked(name, stocks):
+    """Signals best first; ties keep their universe order"""
+    return sorted(stocks, key=lambda stock: -score(name, stock))
+
+def connect(path=DB_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    return con
+
+def record(results, universe=None, run_ts=None, path=DB_PATH):
+    """Write one run's {analyzer: signals} in a single transaction; returns the run timestamp"""
+    if not path:
+        return None
+    run_ts = run_ts or datetime.now(timezone.utc).isoformat(timespec='seconds')
+    rows = [(run_ts, name, stock['symbol'], score(name, stock), json.dumps(stock, default=str))
+            for name, stocks in results.items() for stock in stocks]
+    con = connect(path)
+    try:
+        with con:
+            con.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                            [(name, run_ts, universe, len(stocks)) for name, stocks in results.items()])
+            con.executemany("INSERT OR REPLACE INTO signals VALUES (?, ?, ?, ?, ?)", rows)
+    finally:
+        con.close()
+    return run_ts
+
+def last_runs(con, analyzer, count):
+    rows = con.execute("SELECT run_ts FROM runs WHERE analyzer = ? ORDER BY run_ts DESC LIMIT ?",
+                       (analyzer, count)).fetchall()
+    return [row[0] for row in rows]
+
+def top(analyzer, k=15, run_ts=None, path=DB_PATH):
+    """The k best signals of one run (the latest by default), best first"""
+    con = connect(path)
+    try:
+        if run_ts is None:
+            latest = last_runs(con, analyzer, 1)
+            if not latest:
+                return []
+            run_ts = latest[0]
+        rows = con.execute("SELECT payload FROM signals WHERE analyzer = ? AND run_ts = ? "
+                           "ORDER BY score DESC LIMIT ?", (analyzer, run_ts, k)).fetchall()
+    finally:
+        con.close()
+    return [json.loads(row[0]) for row in rows]
+
+def consecutive(analyzer, runs, path=DB_PATH):
+    """Symbols that signalled in each of the analyzer's last `runs` runs, best latest score first"""
+    con = connect(path)
+    try:
+        recent = last_runs(con, analyzer, runs)
+        if len(recent) < runs:
+            return []
+        marks = ', '.join('?' * runs)
+        rows = con.execute(f"SELECT symbol FROM signals WHERE analyzer = ? AND run_ts IN ({marks}) "
+                           f"GROUP BY symbol HAVING COUNT(*) = ? "
+                           f"ORDER BY MAX(CASE WHEN run_ts = ? THEN score END) DESC, symbol",
+                           (analyzer, *recent, runs, recent[0])).fetchall()
+    finally:
+        con.close()
+    return [row[0] for row in rows]
+
+def history(symbol, analyzer=None, limit=50, path=DB_PATH):
+    """(run_ts, analyzer, signal) for one symbol, newest first"""
+    con = connect(path)
+    try:
+        if analyzer is None:
+            rows = con.execute("SELECT run_ts, analyzer, payload FROM signals WHERE symbol = ? "
+                               "ORDER BY run_ts DESC LIMIT ?", (symbol, limit)).fetchall()
+        else:
+            rows = con.execute("SELECT run_ts, analyzer, payload FROM signals WHERE symbol = ? AND analyzer = ? "
+                               "ORDER BY run_ts DESC LIMIT ?", (symbol, analyzer, limit)).fetchall()
+    finally:
+        con.close()
+    return [(run_ts, name, json.loads(payload)) for run_ts, name, payload in rows]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query the stored scan signals')
+    parser.add_argument('--top', nargs=2, metavar=('ANALYZER', 'K'), help='best K signals of the latest run')
+    parser.add_argument('--streak', nargs=2, metavar=('ANALYZER', 'RUNS'),
+                        help='symbols signalling in each of the last RUNS runs')
+    parser.add_argument('--symbol', help="one symbol's signal history")
+    args = parser.parse_args()
+
+    if not DB_PATH or not os.path.exists(DB_PATH):
+        print(f"❌ No signal store at {DB_PATH}")
+    elif args.top:
+        for stock in top(args.top[0], int(args.top[1])):
+            print(f"{stock['symbol']}: {score(args.top[0], stock):.2f}")
+    elif args.streak:
+        symbols = consecutive(args.streak[0], int(args.streak[1]))
+        print(f"🔁 {len(symbols)} symbols in {args.streak[0]} for {args.streak[1]} consecutive runs")
+        print(', '.join(symbols))
+    elif args.symbol:
+        for run_ts, name, stock in history(args.symbol.upper()):
+            print(f"{run_ts} {name}: {json.dumps(stock)}")
+    else:
+        parser.print_help()
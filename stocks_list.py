@@ -1,3 +1,5 @@
+import os
+
 # HARDCODED STOCK LIST FROM NSE F&O.xlsx
 STOCKS_LIST = [
     "360ONE.NS", "ABB.NS", "APLAPOLLO.NS", "AUBANK.NS", "ADANIENSOL.NS",
@@ -43,3 +45,31 @@ STOCKS_LIST = [
     "UNIONBANK.NS", "UNITDSPR.NS", "VBL.NS", "VEDL.NS", "IDEA.NS",
     "VOLTAS.NS", "WIPRO.NS", "YESBANK.NS", "ZYDUSLIFE.NS"
 ]
+
+# Optional external universe (CSV or xlsx) used instead of the list above
+UNIVERSE_FILE = os.getenv('NSE_UNIVERSE_FILE', '')
+
+# Column names tried, in order, when reading a universe file (NSE's EQUITY_L.csv uses SYMBOL)
+SYMBOL_COLUMNS = ['SYMBOL', 'Symbol', 'symbol', 'Ticker', 'ticker']
+
+def to_yahoo(symbol):
+    """NSE symbol -> Yahoo ticker (adds .NS unless already suffixed)"""
+    symbol = str(symbol).strip().upper()
+    return symbol if '.' in symbol or symbol.startswith('^') else f"{symbol}.NS"
+
+def load_universe(path):
+    """Tickers from a CSV or xlsx file, de-duplicated in file order"""
+    import pandas as pd
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        frame = pd.read_excel(path, engine='openpyxl')
+    else:
+        frame = pd.read_csv(path)
+    frame.columns = [str(c).strip() for c in frame.columns]
+    column = next((c for c in SYMBOL_COLUMNS if c in frame.columns), frame.columns[0])
+    symbols = [to_yahoo(s) for s in frame[column].dropna() if str(s).strip()]
+    return list(dict.fromkeys(symbols))
+
+def get_universe(path=None):
+    """The universe to scan: `path`, else NSE_UNIVERSE_FILE, else the F&O list"""
+    path = path or UNIVERSE_FILE
+    return load_universe(path) if path else list(STOCKS_LIST)
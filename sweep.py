@@ -0,0 +1,231 @@
+import json
+import time
+import argparse
+import itertools
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import market_data
+import screens
+import backtest
+import analysis_smc_1d
+import analysis_bajaj_hourly
+from stocks_list import STOCKS_LIST
+warnings.filterwarnings('ignore')
+
+# Values swept per analyzer parameter (the live scanners' values are LIVE)
+GRID = {
+    'smc': {'threshold': [0.25, 0.30, 0.35, 0.40, 0.45], 'window': [3, 5, 10],
+            'run_bounds': [[2, 5], [3, 5], [3, 6]], 'rally': [0.003, 0.006, 0.01],
+            'volume': [2.0, 3.0], 'min_score': [0, 1]},
+    'bajaj': {'threshold': [0.10, 0.15, 0.20, 0.25], 'window': [5, 10, 20],
+              'run_bounds': [[2, 12], [3, 12], [2, 8]], 'rally': [0.003, 0.006], 'min_score': [0, 1]},
+    'rsi': {'period': [7, 14, 21], 'overbought': [65, 70, 75, 80], 'oversold': [20, 25, 30, 35]},
+}
+
+LIVE = {
+    'smc': {'threshold': 0.35, 'window': 5, 'run_bounds': [3, 5], 'rally': 0.006, 'volume': 2.0, 'min_score': 0},
+    'bajaj': {'threshold': 0.15, 'window': 10, 'run_bounds': [2, 12], 'rally': 0.003, 'min_score': 0},
+    'rsi': {'period': 14, 'overbought': 70, 'oversold': 30},
+}
+
+# Bars scanned past the run's upper bound by each order-block detector (daily 5/5, hourly 14/12)
+EXTRA_RUN = {'smc': 0, 'bajaj': 2}
+
+# Horizon the printed ranking uses, and the fewest resolved signals a combination needs to be ranked
+RANK_HORIZON = {'smc': 5, 'bajaj': 7, 'rsi': 7}
+MIN_SIGNALS = 30
+
+def combinations(grid):
+    """Every parameter set of one analyzer's grid, as dicts"""
+    axes = list(grid)
+    return [dict(zip(axes, values)) for values in itertools.product(*(grid[a] for a in axes))]
+
+def per_value(combos, axes, compute):
+    """compute(*values) once per distinct value of `axes`, spread to a (combinations x bars) matrix"""
+    seen, rows, index = {}, [], []
+    for combo in combos:
+        key = tuple(tuple(combo[a]) if isinstance(combo[a], list) else combo[a] for a in axes)
+        if key not in seen:
+            seen[key] = len(rows)
+            rows.append(compute(*key))
+        index.append(seen[key])
+    return np.array(rows)[index]
+
+def column(combos, axis):
+    return np.array([combo[axis] for combo in combos])[:, None]
+
+def smc_sweep(daily, combos):
+    """smc_signals for every parameter set at once: (combinations x daily bars) signal mask"""
+    open_, high, low, close, volume = backtest.arrays(daily)
+    starts = backtest.lookback_starts(daily.index, analysis_smc_1d.DATA_REQUIREMENTS['1d'])
+    enough = np.arange(len(close)) - starts + 1 >= analysis_smc_1d.MIN_BARS
+    period_high = backtest.rolling(high, starts, 'max')
+    period_low = backtest.rolling(low, starts, 'min')
+    with np.errstate(all='ignore'):
+        discount = np.where(enough & (period_high != period_low), (period_high - close) / period_high, -np.inf)
+    average_volume = pd.Series(volume).rolling(10).mean().to_numpy()
+
+    def swing_low(window):
+        return low <= pd.Series(low).rolling(window).min().shift(1).to_numpy()
+
+    def order_block(bounds, rally):
+        return screens.order_block_series(open_, close, max_run=bounds[1] + EXTRA_RUN['smc'],
+                                          run_bounds=bounds, rally_threshold=rally)
+
+    gate = (discount >= column(combos, 'threshold')) & per_value(combos, ['window'], swing_low)
+    score = (per_value(combos, ['run_bounds', 'rally'], order_block).astype(int) +
+             screens.fair_value_gap_series(open_, close).astype(int) +
+             ((average_volume != 0) & (volume >= average_volume * column(combos, 'volume'))))
+    return gate & (score >= column(combos, 'min_score'))
+
+def bajaj_sweep(hourly, combos):
+    """bajaj_signals for every parameter set at once: (combinations x hourly bars) signal mask"""
+    open_, high, low, close, _ = backtest.arrays(hourly)
+    starts = backtest.lookback_starts(hourly.index, analysis_bajaj_hourly.DATA_REQUIREMENTS['1h'])
+    enough = np.arange(len(close)) - starts + 1 >= analysis_bajaj_hourly.MIN_BARS
+    period_high = backtest.rolling(high, starts, 'max')
+    with np.errstate(all='ignore'):
+        discount = np.where(enough, (period_high - close) / period_high, -np.inf)
+
+    def swing_low(window):
+        return low <= pd.Series(low).rolling(window, min_periods=1).min().shift(1).to_numpy()
+
+    def order_block(bounds, rally):
+        return screens.order_block_series(open_, close, newest=10, oldest=100, max_run=bounds[1] + EXTRA_RUN['bajaj'],
+                                          run_bounds=bounds, rally_threshold=rally)
+
+    gate = (discount > column(combos, 'threshold')) & per_value(combos, ['window'], swing_low)
+    score = per_value(combos, ['run_bounds', 'rally'], order_block).astype(int)
+    return gate & (score >= column(combos, 'min_score'))
+
+def rsi_sweep(daily, four_hour, hourly, combos):
+    """rsi_signals for every parameter set at once: (combinations x hourly bars) of +1/-1/0"""
+    def extremes(period):
+        aligned = np.array(backtest.aligned_rsi(daily, four_hour, hourly, period))
+        return np.stack([aligned.min(axis=0), aligned.max(axis=0)])  # NaN anywhere -> NaN
+
+    lowest, highest = per_value(combos, ['period'], extremes).transpose(1, 0, 2)
+    oversold = highest <= column(combos, 'oversold')
+    overbought = lowest >= column(combos, 'overbought')
+    return np.where(oversold, 1, np.where(overbought, -1, 0))
+
+def new_totals(count, horizons):
+    return {'signals': np.zeros(count), 'latest': np.zeros(count),
+            'horizons': {h: {'n': np.zeros(count), 'hits': np.zeros(count), 'return_sum': np.zeros(count)}
+                         for h in horizons}}
+
+def tally(totals, direction, close, horizons):
+    """Add one symbol's (combinations x bars) signal directions to the totals with matrix products"""
+    direction = np.asarray(direction, dtype=np.float64)
+    long_, short = (direction > 0).astype(np.float64), (direction < 0).astype(np.float64)
+    totals['signals'] += long_.sum(axis=1) + short.sum(axis=1)
+    totals['latest'] += direction[:, -1] != 0
+    for h in horizons:
+        ret = backtest.forward_returns(close, h)
+        valid = ~np.isnan(ret)
+        ret = np.where(valid, ret, 0.0)
+        bucket = totals['horizons'][h]
+        bucket['n'] += (long_ + short) @ valid
+        bucket['hits'] += long_ @ (ret > 0) + short @ (ret < 0)
+        bucket['return_sum'] += direction @ ret
+
+def summarize(combos, totals, live):
+    """One row per parameter set; returns are in the trade's direction"""
+    rows = []
+    for k, combo in enumerate(combos):
+        horizons = {}
+        for h, bucket in totals['horizons'].items():
+            n = int(bucket['n'][k])
+            horizons[str(h)] = {'n': n,
+                                'hit_rate': round(bucket['hits'][k] / n, 4) if n else None,
+                                'mean_return': round(bucket['return_sum'][k] / n, 6) if n else None}
+        rows.append({'params': combo, 'live': combo == live, 'signals': int(totals['signals'][k]),
+                     'latest': int(totals['latest'][k]), 'horizons': horizons})
+    return rows
+
+def sweep_symbol(frames, combos, totals):
+    """Evaluate every combination over one symbol's history and add to the totals"""
+    daily, hourly, four_hour = frames.get('1d'), frames.get('1h'), frames.get('4h')
+    if any(frame is None or frame.empty for frame in (daily, hourly, four_hour)):
+        return False
+    directions = {
+        'smc': (daily, lambda: smc_sweep(daily, combos['smc'])),
+        'bajaj': (hourly, lambda: bajaj_sweep(hourly, combos['bajaj'])),
+        'rsi': (hourly, lambda: rsi_sweep(daily, four_hour, hourly, combos['rsi'])),
+    }
+    for name, (timeline, evaluate) in directions.items():
+        if combos[name]:
+            close = timeline['Close'].to_numpy(dtype=np.float64)
+            tally(totals[name], evaluate(), close, backtest.HORIZONS[name])
+    return True
+
+def best(rows, name, count=5):
+    """Top parameter sets by hit rate at RANK_HORIZON, among those with MIN_SIGNALS resolved signals"""
+    horizon = str(RANK_HORIZON[name])
+    ranked = [row for row in rows if row['horizons'][horizon]['n'] >= MIN_SIGNALS]
+    return sorted(ranked, key=lambda row: -row['horizons'][horizon]['hit_rate'])[:count]
+
+def run(symbols, grid=GRID, output='sweep_results.json'):
+    """Sweep every analyzer's grid over `symbols`' history and write per-combination counts and hit rates"""
+    combos = {name: combinations(grid[name]) if name in grid else [] for name in GRID}
+    totals = {name: new_totals(len(c), backtest.HORIZONS[name]) for name, c in combos.items()}
+    print(f"🧪 Sweeping {sum(len(c) for c in combos.values())} parameter sets "
+          f"({', '.join(f'{name} {len(c)}' for name, c in combos.items())}) over {len(symbols)} stocks")
+
+    loading = sweeping = 0.0
+    replayed = 0
+    for chunk in market_data.chunks(list(symbols), market_data.BATCH_SIZE):
+        started = time.perf_counter()
+        history = backtest.load_history(chunk)
+        loading += time.perf_counter() - started
+        started = time.perf_counter()
+        for symbol in chunk:
+            replayed += sweep_symbol(history[symbol], combos, totals)
+        sweeping += time.perf_counter() - started
+        print(f"   [{replayed:4d}/{len(symbols)}] symbols swept")
+
+    results = {name: summarize(combos[name], totals[name], LIVE[name]) for name in combos}
+    report = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'symbols': len(symbols),
+        'replayed': replayed,
+        'history': backtest.HISTORY,
+        'combinations': {name: len(c) for name, c in combos.items()},
+        'seconds': {'load': round(loading, 2), 'sweep': round(sweeping, 2)},
+        'grid': grid,
+        'results': results,
+    }
+    for name, rows in results.items():
+        horizon = str(RANK_HORIZON[name])
+        live = next((row for row in rows if row['live']), None)
+        if live:
+            print(f"📏 {name} live: {live['signals']} signals, hit rate @{horizon} {live['horizons'][horizon]['hit_rate']}")
+        for row in best(rows, name):
+            print(f"   🏅 {row['params']}: {row['signals']} signals, hit rate @{horizon} "
+                  f"{row['horizons'][horizon]['hit_rate']}")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Sweep written to {output} (sweep {sweeping:.1f}s, download {loading:.1f}s)")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Evaluate grids of scanner thresholds over history in one pass')
+    parser.add_argument('--symbols', type=int, default=None, help='only the first N stocks')
+    parser.add_argument('--grid', help='JSON file of {analyzer: {parameter: [values]}} replacing the default grid')
+    parser.add_argument('--output', default='sweep_results.json')
+    args = parser.parse_args()
+
+    grid = GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+        unknown = [name for name in grid if name not in GRID]
+        if unknown:
+            parser.error(f"unknown analyzer(s) {', '.join(unknown)}; choose from {', '.join(GRID)}")
+        # Parameters a grid leaves out stay at their live value
+        grid = {name: {**{k: [v] for k, v in LIVE[name].items()}, **axes} for name, axes in grid.items()}
+    run(STOCKS_LIST[:args.symbols], grid, args.output)
@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import threading
+import cProfile
+import pstats
+from collections import defaultdict, Counter
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# JSON run report written at the end of each scan (empty = don't write one)
+REPORT_PATH = os.getenv('NSE_RUN_REPORT', 'run_report.json')
+
+# NSE_PROFILE=cprofile (main thread, deterministic) or sample (all threads, statistical)
+PROFILE = os.getenv('NSE_PROFILE', '')
+PROFILE_PATH = os.getenv('NSE_PROFILE_PATH', 'run_profile')
+SAMPLE_INTERVAL = float(os.getenv('NSE_PROFILE_INTERVAL', '0.005'))
+
+FAILURE_KINDS = ('empty_frame', 'too_short', 'rate_limited', 'timeout', 'circuit_open', 'parse_error', 'other')
+
+def peak_memory_mb():
+    """Peak resident memory of this process and of its largest exited child process, in MB"""
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    return {'main': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+            'workers': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)}
+
+def classify_message(message):
+    """Failure kind for a yfinance error message"""
+    text = message.lower()
+    if 'rate limit' in text or 'ratelimit' in text or 'too many requests' in text:
+        return 'rate_limited'
+    if 'timed out' in text or 'timeout' in text:
+        return 'timeout'
+    if 'delisted' in text or 'no data' in text or 'no price data' in text or 'not found' in text:
+        return 'empty_frame'
+    if 'json' in text or 'decode' in text or 'parse' in text or 'expecting value' in text:
+        return 'parse_error'
+    return 'other'
+
+def classify_exception(error):
+    """Failure kind for an exception raised while fetching or evaluating"""
+    name = type(error).__name__
+    if 'RateLimit' in name:
+        return 'rate_limited'
+    if name == 'CircuitOpen':
+        return 'circuit_open'
+    if 'Timeout' in name or isinstance(error, TimeoutError):
+        return 'timeout'
+    if name in ('YFPricesMissingError', 'YFTickerMissingError', 'EmptyDataError'):
+        return 'empty_frame'
+    if isinstance(error, IndexError):
+        return 'too_short'
+    if isinstance(error, (ValueError, KeyError, TypeError)):
+        return 'parse_error'
+    return classify_message(repr(error))
+
+def classify_frames(frames, min_bars):
+    """Why a loader found no usable data: 'empty_frame', 'too_short' or None.
+
+    `frames` are the frames it read (None for ones never loaded); None
+    means the data was fine and the loader screened the symbol out.
+    """
+    loaded = [f for f in frames if f is not None]
+    if not loaded or any(f.empty for f in loaded):
+        return 'empty_frame'
+    if any(len(f) < min_bars for f in loaded):
+        return 'too_short'
+    return None
+
+def percentiles(values):
+    if not values:
+        return None
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': round(float(p50), 4), 'p90': round(float(p90), 4), 'p99': round(float(p99), 4),
+            'max': round(float(max(values)), 4), 'count': len(values)}
+
+class RunTelemetry:
+    """Timings, fetch metrics, cache hits and classified failures for one run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.stages = defaultdict(float)
+        self.analyzers = defaultdict(float)
+        self.fetch_latency = defaultdict(list)
+        self.fetch_symbols = Counter()
+        self.fetch_bytes = Counter()
+        self.throttled = 0.0
+        self.cache = defaultdict(Counter)
+        self.failures = []
+        self.extra = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Accumulate wall time under `name` (stages may repeat per batch)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(self.stages, name, time.perf_counter() - start)
+
+    def add_time(self, table, name, seconds):
+        with self._lock:
+            table[name] += seconds
+
+    def record_fetch(self, interval, seconds, symbols, nbytes, throttled=0.0):
+        with self._lock:
+            self.fetch_latency[interval].append(seconds)
+            self.fetch_symbols[interval] += symbols
+            self.fetch_bytes[interval] += int(nbytes)
+            self.throttled += throttled
+
+    def record_cache(self, interval, outcome, count=1):
+        """outcome: 'hit' (topped up from disk), 'revised' (refetched) or 'miss'"""
+        if count:
+            with self._lock:
+                self.cache[interval][outcome] += count
+
+    def record_failure(self, symbol, where, kind, detail=''):
+        """`where` is an interval for download failures, an analyzer name otherwise"""
+        with self._lock:
+            self.failures.append({'symbol': symbol, 'where': where, 'kind': kind, 'detail': detail[:200]})
+
+    def drop_failures(self, symbol, where):
+        """Forget failures that a later retry recovered from"""
+        with self._lock:
+            self.failures = [f for f in self.failures if f['symbol'] != symbol or f['where'] != where]
+
+    def failed_symbols(self):
+        return len({failure['symbol'] for failure in self.failures})
+
+    def failure_counts(self):
+        counts = defaultdict(Counter)
+        for failure in self.failures:
+            counts[failure['where']][failure['kind']] += 1
+        return {where: dict(kinds) for where, kinds in counts.items()}
+
+    def report(self, **extra):
+        cache = {}
+        for interval, outcomes in self.cache.items():
+            total = sum(outcomes.values())
+            cache[interval] = dict(outcomes, hit_rate=round(outcomes['hit'] / total, 4) if total else None)
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'wall_seconds': round(time.time() - self.started, 3),
+            'stages': {name: round(s, 4) for name, s in self.stages.items()},
+            'analyzers': {name: round(s, 4) for name, s in self.analyzers.items()},
+            'fetch': {interval: {'latency': percentiles(latencies),
+                                 'symbols': self.fetch_symbols[interval],
+                                 'bytes': self.fetch_bytes[interval]}
+                      for interval, latencies in self.fetch_latency.items()},
+            'throttled_seconds': round(self.throttled, 3),
+            'peak_memory_mb': peak_memory_mb(),
+            'cache': cache,
+            'failures': {'total': len(self.failures),
+                         'by_kind': dict(Counter(f['kind'] for f in self.failures)),
+                         'by_source': self.failure_counts(),
+                         'symbols': self.failures},
+            **self.extra,
+            **extra,
+        }
+
+    def save(self, path=REPORT_PATH, **extra):
+        report = self.report(**extra)
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+        return report
+
+TELEMETRY = RunTelemetry()
+
+def sample_stacks(stop, counts, interval):
+    """Count every function on each thread's stack, every `interval` seconds"""
+    me = threading.get_ident()
+    while not stop.wait(interval):
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            seen = set()
+            leaf = True
+            while frame is not None:
+                key = f"{frame.f_code.co_filename}:{frame.f_code.co_firstlineno}({frame.f_code.co_name})"
+                if key not in seen:
+                    seen.add(key)
+                    counts[key] += [1, 1] if leaf else [0, 1]
+                leaf = False
+                frame = frame.f_back
+
+@contextmanager
+def profiled(mode=PROFILE, path=PROFILE_PATH, top=30):
+    """Profile the enclosed block and write the hottest functions to `path`.
+
+    cprofile writes path.prof (for snakeviz/pstats) and path.txt, covering
+    the main thread only. sample polls every thread's stack and writes
+    path.txt with self/total sample counts per function.
+    """
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path + '.prof')
+            with open(path + '.txt', 'w') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(top)
+            print(f"🔬 Profile written to {path}.prof")
+    elif mode == 'sample':
+        counts = defaultdict(lambda: np.zeros(2, dtype=np.int64))
+        stop = threading.Event()
+        sampler = threading.Thread(target=sample_stacks, args=(stop, counts, SAMPLE_INTERVAL), daemon=True)
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            with open(path + '.txt', 'w') as f:
+                f.write(f"{'self':>8} {'total':>8}  function\n")
+                for key, (own, total) in sorted(counts.items(), key=lambda kv: (-kv[1][0], -kv[1][1]))[:top]:
+                    f.write(f"{own:8d} {total:8d}  {key}\n")
+            print(f"🔬 Sampled profile written to {path}.txt")
+    else:
+        yield
@@ -0,0 +1,28 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# The scanner is a set of top-level modules; make them importable from tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ohlcv import OHLCV
+
+def random_bars(rng, n, flat=False):
+    """Random-walk OHLCV with frequent bullish/bearish runs (flat=True: constant closes)"""
+    close = np.full(n, 100.0) if flat else 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * (1 + rng.normal(0, 0.006, n))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.004, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.004, n))
+    timestamps = np.datetime64('2024-01-01T03:45') + np.arange(n) * np.timedelta64(1, 'h')
+    return OHLCV(timestamps, open_, high, low, close, rng.uniform(1e5, 1e6, n))
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+@pytest.fixture
+def universe(rng):
+    """Bars for 60 symbols of varying length, a few too short or flat"""
+    lengths = [int(n) for n in rng.integers(2, 300, 60)]
+    return [random_bars(rng, n, flat=(k % 13 == 0)) for k, n in enumerate(lengths)]
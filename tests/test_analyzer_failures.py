@@ -0,0 +1,42 @@
+"""A bug in a shared indicator node must surface as an analyzer failure, not as "no signal\""""
+import pytest
+
+import indicators
+import pipeline
+from conftest import random_bars
+from analysis_smc_1d import evaluate_smc_daily, detect_order_block, calculate_discount_zone
+from analysis_bajaj_hourly import evaluate_bajaj_hourly, is_swing_low_hourly
+from analysis_engulfing_4h import evaluate_engulfing_4h
+from analysis_rsi_mtf import calculate_rsi
+
+@pytest.fixture
+def broken_graph(monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError('broken node')
+    for node in ('run_lengths', 'bullish', 'bearish', 'highest', 'lowest', 'rsi'):
+        monkeypatch.setattr(indicators.IndicatorGraph, node, broken)
+    yield
+    indicators.GRAPHS.clear()
+
+def test_helpers_raise_on_a_broken_node(broken_graph, rng):
+    data = random_bars(rng, 150)
+    for check in (detect_order_block, calculate_discount_zone, is_swing_low_hourly, calculate_rsi):
+        with pytest.raises(ValueError):
+            check(data)
+    for evaluate in (evaluate_smc_daily, evaluate_bajaj_hourly, evaluate_engulfing_4h):
+        with pytest.raises(ValueError):
+            evaluate('X.NS', data)
+
+def test_short_input_is_still_no_signal(rng):
+    empty = random_bars(rng, 0)
+    assert not calculate_discount_zone(empty)
+    assert not is_swing_low_hourly(random_bars(rng, 1))
+    assert not detect_order_block(empty)
+
+def test_evaluate_bundle_counts_the_failure(broken_graph, rng):
+    pipeline.load_analyzers()
+    data = random_bars(rng, 150)
+    results, failures, _ = pipeline.evaluate_bundle('X.NS', {'smc': data, 'engulfing': data})
+    assert results == {'smc': None, 'engulfing': None}
+    assert sorted(name for name, _, _ in failures) == ['engulfing', 'smc']
+    assert not [key for key in indicators.GRAPHS if key[0] == 'X.NS']
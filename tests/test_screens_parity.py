@@ -0,0 +1,175 @@
+"""Batch and vectorized screens against the scalar scanners they replace"""
+import numpy as np
+
+import screens
+import rsi_engine
+import indicators
+from conftest import random_bars
+from analysis_smc_1d import (detect_order_block, detect_fair_value_gap, evaluate_smc_daily,
+                             calculate_discount_zone, is_swing_low, screen_smc_daily)
+from analysis_bajaj_hourly import (detect_order_block_hourly, calculate_discount_hourly, is_swing_low_hourly,
+                                   screen_bajaj_hourly)
+from analysis_rsi_mtf import calculate_rsi, evaluate_rsi_mtf, scan_rsi_mtf, TIMEFRAMES
+from analysis_engulfing_4h import evaluate_engulfing_4h, scan_engulfing_4h
+
+def loop_order_block(data, newest=6, oldest=25, max_run=5, run_bounds=(3, 5), rally_threshold=0.006):
+    """The original per-candidate order-block loop"""
+    close, open_ = data['close'], data['open']
+    for i in range(len(close) - newest, max(len(close) - oldest, 0), -1):
+        if close[i] < open_[i]:
+            count = 0
+            for j in range(i + 1, min(i + max_run + 1, len(close))):
+                if close[j] > open_[j]:
+                    count += 1
+                else:
+                    break
+            if run_bounds[0] <= count <= run_bounds[1]:
+                return (close[i + count] - close[i + 1]) / close[i + 1] > rally_threshold
+    return False
+
+def loop_fair_value_gap(data):
+    """The original per-candidate fair-value-gap loop"""
+    close, open_ = data['close'], data['open']
+    for i in range(len(close) - 7, max(len(close) - 15, 0), -1):
+        count = 0
+        for j in range(i, min(i + 6, len(close) - 1)):
+            if close[j] > open_[j]:
+                count += 1
+            else:
+                break
+        if 3 <= count <= 6:
+            return close[i + count] < open_[i + count]
+    return False
+
+def loop_rsi(close, period=14):
+    """The original list-based Wilder RSI"""
+    if len(close) < period + 1:
+        return None
+    deltas = np.diff(np.asarray(close, dtype=np.float64))
+    gains = np.where(deltas > 0, deltas, 0.0).tolist()
+    losses = np.where(deltas < 0, -deltas, 0.0).tolist()
+    avg_gain, avg_loss = sum(gains[:period]) / period, sum(losses[:period]) / period
+    values = []
+    for i in range(period, len(deltas)):
+        values.append(100 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss))
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+    return values[-1] if values else None
+
+def test_order_block_and_fvg_match_the_loops(universe):
+    for data in universe:
+        assert detect_order_block(data) == loop_order_block(data)
+        assert detect_fair_value_gap(data) == loop_fair_value_gap(data)
+        assert detect_order_block_hourly(data) == loop_order_block(data, 10, 100, 14, (2, 12), 0.003)
+
+def gate_rows(rng, universe):
+    """The universe plus empty, one-bar, flat and steadily falling rows"""
+    falling = []
+    for n in (30, 120, 250):
+        data = random_bars(rng, n)
+        data.close[:] = 100 * np.exp(np.linspace(0, -0.8, n))
+        data.open[:], data.high[:] = data.close * 1.002, data.close * 1.004
+        data.low[:] = data.close * 0.99
+        falling.append(data)
+    return universe + [random_bars(rng, 0), random_bars(rng, 1), random_bars(rng, 40, flat=True)] + falling
+
+def test_discount_and_swing_low_masks_match_scalar(universe, rng):
+    datas = gate_rows(rng, universe)
+    m, lengths = screens.stack_ohlc(datas)
+    checks = {
+        calculate_discount_zone: screens.discount_mask(m['high'], m['low'], m['close']),
+        calculate_discount_hourly: screens.discount_mask(m['high'], m['low'], m['close'], 0.15, False, False),
+        is_swing_low: screens.swing_low_mask(m['low'], lengths),
+        is_swing_low_hourly: screens.swing_low_mask(m['low'], lengths, 10, False),
+    }
+    for scalar, mask in checks.items():
+        assert [bool(scalar(data)) for data in datas] == mask.tolist(), scalar.__name__
+        assert mask.any()
+
+def test_masks_handle_only_short_or_empty_rows(rng):
+    for datas in ([random_bars(rng, 0)], [random_bars(rng, 0), random_bars(rng, 1)]):
+        m, lengths = screens.stack_ohlc(datas)
+        assert not screens.discount_mask(m['high'], m['low'], m['close']).any()
+        assert not screens.swing_low_mask(m['low'], lengths, 10, False).any()
+        assert not screen_smc_daily(datas).any() and not screen_bajaj_hourly(datas).any()
+
+def test_batch_gates_match_evaluate_gates(universe, rng):
+    datas = gate_rows(rng, universe)
+    smc = [bool(calculate_discount_zone(d) and is_swing_low(d)) for d in datas]
+    bajaj = [bool(calculate_discount_hourly(d) and is_swing_low_hourly(d)) for d in datas]
+    assert screen_smc_daily(datas).tolist() == smc
+    assert screen_bajaj_hourly(datas).tolist() == bajaj
+    assert any(smc) and any(bajaj)
+
+def test_series_never_look_ahead(universe):
+    data = max(universe, key=len)
+    order_block = screens.order_block_series(data['open'], data['close'])
+    fvg = screens.fair_value_gap_series(data['open'], data['close'])
+    for t in range(len(data)):
+        prefix = data.window(0, t + 1)
+        assert order_block[t] == loop_order_block(prefix)
+        assert fvg[t] == loop_fair_value_gap(prefix)
+
+def test_engulfing_scan_matches_evaluate(universe, rng):
+    # Plant a bullish and a bearish engulfing so both branches are exercised
+    for data, sign in ((universe[1], 1), (universe[2], -1)):
+        data.open[-3], data.close[-3] = 100 + sign, 100 - sign
+        data.open[-2], data.close[-2] = 100 - 2 * sign, 100 + 2 * sign
+        data.high[-3:-1], data.low[-3:-1] = (102, 103), (98, 97)
+    symbols = [f"S{k}.NS" for k in range(len(universe))]
+    datas = [d if len(d) >= 3 else None for d in universe]
+    batch = scan_engulfing_4h(symbols, datas)
+    scalar = [evaluate_engulfing_4h(s, d) if d is not None else None for s, d in zip(symbols, datas)]
+    assert batch == scalar
+    assert {r['pattern'] for r in batch if r} == {'BULLISH', 'BEARISH'}
+
+def test_wilder_rsi_matches_loop_bar_for_bar(universe):
+    closes = [d['close'] for d in universe]
+    rsi = rsi_engine.wilder_rsi(rsi_engine.stack_closes(closes))
+    width = rsi.shape[1]
+    for row, close in enumerate(closes[:10]):
+        for t in range(len(close)):
+            expected = loop_rsi(close[:t + 1])
+            got = rsi[row, width - len(close) + t]
+            if expected is None:
+                assert np.isnan(got)
+            else:
+                assert np.isclose(got, expected, rtol=0, atol=1e-9)
+
+def test_rsi_scan_matches_evaluate(rng):
+    # Long trends push all three timeframes to the same extreme
+    symbols, data_dicts = [], []
+    for k in range(30):
+        drift = (-1) ** k * 0.02 if k % 3 else 0.0
+        bars = {}
+        for tf in TIMEFRAMES:
+            close = 100 * np.exp(np.cumsum(rng.normal(drift, 0.01, 80)))
+            data = random_bars(rng, 80)
+            data.close[:] = close
+            bars[tf] = data
+        symbols.append(f"S{k}.NS")
+        data_dicts.append(bars)
+    batch = scan_rsi_mtf(symbols, data_dicts)
+    scalar = [evaluate_rsi_mtf(s, d) for s, d in zip(symbols, data_dicts)]
+    assert len(batch) == len(scalar)
+    for b, s in zip(batch, scalar):
+        assert (b is None) == (s is None)
+        if b is not None:
+            assert b['confluence'] == s['confluence']
+            for tf in TIMEFRAMES:
+                assert abs(b[f'{tf}_RSI'] - s[f'{tf}_RSI']) <= 0.01
+    assert any(batch)
+
+def test_indicator_graph_windows_match_standalone(universe):
+    for data in universe:
+        root = indicators.graph('X.NS', '1d', data)
+        for n in {len(data), len(data) // 2, 20, 3}:
+            window = data.tail(n)
+            graph = indicators.graph('X.NS', '1d', window)
+            assert graph is root or graph.parent is root
+            assert calculate_rsi(window, graph=graph) == loop_rsi(window['close'])
+            assert np.array_equal(graph.run_lengths(), screens.bullish_run_lengths(window['open'], window['close']))
+            assert detect_order_block(window, graph) == loop_order_block(window)
+        assert evaluate_smc_daily('X.NS', data) == evaluate_smc_daily('X.NS', data.window(0, len(data)))
+        indicators.release('X.NS')
+    assert not [key for key in indicators.GRAPHS if key[0] == 'X.NS']